@@ -1,23 +1,28 @@
-from typing import List
-from fastapi import Depends, HTTPException, APIRouter
-from sqlalchemy.orm import Session
-from auction_app.db.database import SessionLocal
-from auction_app.db.models import Auction
-from auction_app.db.schema import AuctionSchema
+from typing import List, Literal, Optional
+from fastapi import Depends, HTTPException, APIRouter, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from auction_app.api.pagination import KeysetPage, PageParams, paginate
+from auction_app.config import AUCTION_VIEW_BIDS, PAGE_SIZE_MAX
+from auction_app.db.database import get_db
+from auction_app.db.models import Auction, Car, StatusCar, UserProfile
+from auction_app.db.schema import AuctionPriceSchema, AuctionSchema, AuctionViewSchema, LeaderboardEntrySchema
+from auction_app.services.cache import cache_key, invalidate, json_response, read_through, serialize
+from auction_app.services.archive import bid_cache_keys, bid_model
+from auction_app.services.events import publish_status
+from auction_app.services.leaderboard import current_prices, leaderboard_keys, top_bidders
+from auction_app.services.ratings import summary
+from auction_app.services.scheduler import schedule_deadline, unschedule_deadline
+from auction_app.services.rate_limit import write_limit
+from auction_app.services.serialization import dump, fast_response
 
 auction_router = APIRouter(prefix='/auction', tags=['Auction'])
 
-# Dependency to get the DB session
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 # Create a new auction
-@auction_router.post('/', response_model=AuctionSchema, summary='Создать аукцион')
-async def create_auction(auction: AuctionSchema, db: Session = Depends(get_db)):
+@auction_router.post('/', dependencies=[Depends(write_limit)], response_model=AuctionSchema, summary='Создать аукцион')
+async def create_auction(auction: AuctionSchema, db: AsyncSession = Depends(get_db)):
     auction_db = Auction(
         car_id=auction.car_id,
         start_price=auction.start_price,
@@ -27,32 +32,93 @@ async def create_auction(auction: AuctionSchema, db: Session = Depends(get_db)):
         status=auction.status
     )
     db.add(auction_db)
-    db.commit()
-    db.refresh(auction_db)
+    await db.commit()
+    await db.refresh(auction_db)
+    if auction_db.status == StatusCar.active:
+        await schedule_deadline(auction_db.id, auction_db.end_time)
     return auction_db
 
-# Get all auctions
-@auction_router.get('/', response_model=List[AuctionSchema], summary='Получить все аукционы')
-async def auction_list(db: Session = Depends(get_db)):
-    return db.query(Auction).all()
+AUCTION_SORT_COLUMNS = {'id': Auction.id, 'end_time': Auction.end_time}
+
+
+def auction_list_query(status: Optional[StatusCar] = None):
+    query = select(Auction)
+    if status:
+        query = query.where(Auction.status == status)
+    return query
+
+# Get auctions page by page
+@auction_router.get('/', response_model=KeysetPage[AuctionSchema], summary='Получить все аукционы')
+async def auction_list(status: Optional[StatusCar] = None,
+                       sort: Literal['id', '-id', 'end_time', '-end_time'] = '-id',
+                       params: PageParams = Depends(), db: AsyncSession = Depends(get_db)):
+    page = await paginate(db, auction_list_query(status), Auction, sort, AUCTION_SORT_COLUMNS, params)
+    return fast_response(KeysetPage[AuctionSchema], page)
+
+# Current prices of many auctions (e.g. a grid page), read from the leaderboards
+@auction_router.get('/prices', response_model=List[AuctionPriceSchema], summary='Текущие цены аукционов')
+async def auction_prices(ids: List[int] = Query(..., max_length=PAGE_SIZE_MAX), db: AsyncSession = Depends(get_db)):
+    return await current_prices(db, ids)
 
 # Get an auction by ID
 @auction_router.get('/{auction_id}', response_model=AuctionSchema, summary='Получить аукцион по ID')
-async def auction_detail(auction_id: int, db: Session = Depends(get_db)):
-    auction = db.query(Auction).filter(Auction.id == auction_id).first()
+async def auction_detail(auction_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    async def load():
+        auction = await db.get(Auction, auction_id)
+        return serialize(AuctionSchema, auction) if auction else None
+
+    body = await read_through(cache_key('auction', auction_id), load)
+    if body is None:
+        raise HTTPException(status_code=404, detail='Аукцион не найден')
+    return json_response(request, body)
 
+# Everything an auction page needs in two queries: the auction joined with its car, seller
+# and seller rating, then the top bids through ix_bid_auction_amount. Bids are not
+# selectin-loaded because that would fetch every bid of a busy auction.
+@auction_router.get('/{auction_id}/view', response_model=AuctionViewSchema, summary='Страница аукциона')
+async def auction_view(auction_id: int, bids: int = Query(AUCTION_VIEW_BIDS, ge=0, le=PAGE_SIZE_MAX),
+                       db: AsyncSession = Depends(get_db)):
+    auction = await db.scalar(
+        select(Auction)
+        .where(Auction.id == auction_id)
+        .options(joinedload(Auction.car).joinedload(Car.seller).joinedload(UserProfile.rating))
+    )
     if auction is None:
         raise HTTPException(status_code=404, detail='Аукцион не найден')
-    return auction
+
+    model = bid_model(auction)
+    top_bids = (await db.scalars(
+        select(model)
+        .where(model.auction_id == auction_id)
+        .order_by(model.amount.desc(), model.id)
+        .limit(bids)
+    )).all() if bids else []
+
+    seller = auction.car.seller
+    return fast_response(AuctionViewSchema, {
+        **dump(AuctionSchema, auction),
+        'car': auction.car,
+        'seller': {'id': seller.id, 'username': seller.username, 'rating': summary(seller.id, seller.rating)},
+        'top_bids': top_bids,
+    })
+
+# Top bidders by their highest bid
+@auction_router.get('/{auction_id}/top', response_model=List[LeaderboardEntrySchema], summary='Лидеры аукциона')
+async def auction_top(auction_id: int, n: int = Query(10, ge=1, le=PAGE_SIZE_MAX), db: AsyncSession = Depends(get_db)):
+    entries = await top_bidders(db, auction_id, n)
+    if entries is None:
+        raise HTTPException(status_code=404, detail='Аукцион не найден')
+    return entries
 
 # Update an auction
-@auction_router.put('/{auction_id}', response_model=AuctionSchema, summary='Обновить аукцион')
-async def auction_update(auction_id: int, auction: AuctionSchema, db: Session = Depends(get_db)):
-    auction_db = db.query(Auction).filter(Auction.id == auction_id).first()
+@auction_router.put('/{auction_id}', dependencies=[Depends(write_limit)], response_model=AuctionSchema, summary='Обновить аукцион')
+async def auction_update(auction_id: int, auction: AuctionSchema, db: AsyncSession = Depends(get_db)):
+    auction_db = await db.get(Auction, auction_id)
 
     if auction_db is None:
         raise HTTPException(status_code=404, detail='Аукцион не найден')
 
+    status_changed = (auction_db.status, auction_db.end_time) != (auction.status, auction.end_time)
     auction_db.car_id = auction.car_id
     auction_db.start_price = auction.start_price
     auction_db.min_price = auction.min_price
@@ -61,18 +127,28 @@ async def auction_update(auction_id: int, auction: AuctionSchema, db: Session =
     auction_db.status = auction.status
 
     db.add(auction_db)
-    db.commit()
-    db.refresh(auction_db)
+    await db.commit()
+    await db.refresh(auction_db)
+    await invalidate(cache_key('auction', auction_id))
+    if status_changed:
+        if auction_db.status == StatusCar.active:
+            await schedule_deadline(auction_db.id, auction_db.end_time)
+        else:
+            await unschedule_deadline(auction_db.id)
+        await publish_status(auction_db)
     return auction_db
 
 # Delete an auction
-@auction_router.delete('/{auction_id}', summary='Удалить аукцион')
-async def auction_delete(auction_id: int, db: Session = Depends(get_db)):
-    auction_db = db.query(Auction).filter(Auction.id == auction_id).first()
+@auction_router.delete('/{auction_id}', dependencies=[Depends(write_limit)], summary='Удалить аукцион')
+async def auction_delete(auction_id: int, db: AsyncSession = Depends(get_db)):
+    auction_db = await db.get(Auction, auction_id)
 
     if auction_db is None:
         raise HTTPException(status_code=404, detail='Аукцион не найден')
 
-    db.delete(auction_db)
-    db.commit()
+    bid_keys = await bid_cache_keys(db, auction_id)
+    await db.delete(auction_db)
+    await db.commit()
+    await invalidate(cache_key('auction', auction_id), *leaderboard_keys(auction_id), *bid_keys)
+    await unschedule_deadline(auction_id)
     return {'message': 'Аукцион удален'}
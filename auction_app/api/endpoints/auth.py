@@ -1,28 +1,23 @@
 from auction_app.config import (SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, ALGORITHM)
-from jose import jwt
-from passlib.context import CryptContext
+import uuid
+from jose import JWTError, jwt
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from datetime import timedelta, datetime
 from fastapi_limiter.depends import RateLimiter
-from auction_app.db.database import SessionLocal
+from auction_app.db.database import get_db
 from typing import Optional
 from auction_app.db.schema import UserProfileSchema
-from auction_app.db.models import UserProfile, RefreshToken
+from auction_app.db.models import UserProfile
+from auction_app.services.passwords import password_hasher
+from auction_app.services.tokens import token_store
+from auction_app.services.rate_limit import write_limit
 from fastapi import Depends, HTTPException, status, APIRouter
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 auth_router = APIRouter(prefix='/auth')
 
 oauth2_schema = OAuth2PasswordBearer(tokenUrl='/auth/login/')
-password_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
-
-
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -33,23 +28,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 
 def create_refresh_token(data: dict, ):
-    return create_access_token(data, expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    # jti keeps tokens issued in the same second unique
+    return create_access_token({**data, 'jti': uuid.uuid4().hex}, expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+
+
+def check_refresh_token(refresh_token: str):
+    try:
+        jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Маалымат туура эмес')
 
 
-def verify_password(plain_password, hash_password):
-    return password_context.verify(plain_password, hash_password)
+async def verify_password(plain_password, hash_password):
+    return await password_hasher.verify(plain_password, hash_password)
 
 
-def get_password_hash(password):
-    return password_context.hash(password)
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
 
 
-@auth_router.post('/register/', tags=['Авторизация'], summary='Регистрация')
-async def register(user: UserProfileSchema, db: Session = Depends(get_db)):
-    user_db = db.query(UserProfile).filter(UserProfile.username == user.username).first()
+@auth_router.post('/register/', dependencies=[Depends(write_limit)], tags=['Авторизация'], summary='Регистрация')
+async def register(user: UserProfileSchema, db: AsyncSession = Depends(get_db)):
+    user_db = await db.scalar(select(UserProfile).where(UserProfile.username == user.username))
     if user_db:
         raise HTTPException(status_code=400, detail='username бар экен')
-    new_hash_pass = get_password_hash(user.hashed_password)
+    new_hash_pass = await get_password_hash(user.hashed_password)
     new_user = UserProfile(
         username=user.username,
         email=user.email,
@@ -59,39 +62,47 @@ async def register(user: UserProfileSchema, db: Session = Depends(get_db)):
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return {'message': 'User successfully registered'}
 
 
 @auth_router.post('/login', dependencies=[Depends(RateLimiter(times=5, seconds=180))],
                   tags=['Авторизация'], summary='Авторизация')
-async def login(from_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(UserProfile).filter(UserProfile.username == from_data.username).first()
-    if not user or not verify_password(from_data.password, user.hashed_password):
+async def login(from_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(UserProfile).where(UserProfile.username == from_data.username))
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Маалымат туура эмес')
+    valid, new_hash = await password_hasher.verify_and_update(from_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Маалымат туура эмес')
+    # Transparently upgrade hashes made with deprecated bcrypt settings
+    if new_hash:
+        user.hashed_password = new_hash
     access_token = create_access_token({'sub': user.username})
     refresh_token = create_refresh_token({'sub': user.username})
-    token_db = RefreshToken(token=refresh_token, user_id=user.id)
-    db.add(token_db)
-    db.commit()
+    await token_store.save(db, refresh_token, user.id, user.username)
+    if new_hash:
+        await db.commit()
     return {'access_token': access_token, 'refresh_token': refresh_token, 'token_type': 'bearer'}
 
 
 @auth_router.post('/logout', tags=['Авторизация'], summary='выход из системы')
-async def logout(refresh_token: str, db: Session = Depends(get_db)):
-    stored_token = db.query(RefreshToken).filter(RefreshToken.token == refresh_token).first()
-    if not stored_token:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detatil='Маалымат туура эмес')
-    db.delete(stored_token)
-    db.commit()
+async def logout(refresh_token: str, db: AsyncSession = Depends(get_db)):
+    if not await token_store.revoke(db, refresh_token):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Маалымат туура эмес')
     return {'message': 'Вышли'}
 
 
 @auth_router.post('/refresh/', tags=['Авторизация'], summary='Рефреш токен')
-async def refresh(refresh_token: str, db: Session = Depends(get_db)):
-    token_entry = db.query(RefreshToken).filter(RefreshToken.token == refresh_token).first()
-    if not token_entry:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detatil='Маалымат туура эмес')
-    access_token = create_access_token({'sub': token_entry.user_id})
-    return {'access_token': access_token, 'token_type': 'bearer'}
+async def refresh(refresh_token: str, db: AsyncSession = Depends(get_db)):
+    check_refresh_token(refresh_token)
+    owner = await token_store.consume(db, refresh_token)
+    if owner is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Маалымат туура эмес')
+    user_id, username = owner
+    # Rotation: the presented token is spent and a new one is issued
+    access_token = create_access_token({'sub': username})
+    new_refresh_token = create_refresh_token({'sub': username})
+    await token_store.save(db, new_refresh_token, user_id, username)
+    return {'access_token': access_token, 'refresh_token': new_refresh_token, 'token_type': 'bearer'}
@@ -1,56 +1,112 @@
-from typing import List
-from fastapi import Depends, HTTPException, APIRouter
-from sqlalchemy.orm import Session
-from auction_app.db.database import SessionLocal
-from auction_app.db.models import Bid
-from auction_app.db.schema import BidSchema
+import asyncio
+from typing import Literal, Optional
+from fastapi import Depends, HTTPException, APIRouter, Request, WebSocket
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from auction_app.config import BID_INGEST
+from auction_app.api.pagination import KeysetPage, PageParams, paginate
+from auction_app.db.database import get_db
+from auction_app.db.models import Auction, Bid, BidArchive
+from auction_app.db.schema import BidSchema, ProxyBidSchema
+from auction_app.services.archive import bid_model
+from auction_app.services.bidding import place_bid, recalculate_auction, set_proxy
+from auction_app.services.cache import cache_key, invalidate, json_response, read_through, serialize
+from auction_app.services.events import broadcaster
+from auction_app.services.ingest import bid_ingestor
+from auction_app.services.leaderboard import leaderboard_keys
+from auction_app.services.rate_limit import bid_limit, write_limit
+from auction_app.services.serialization import fast_response
 
 bid_router = APIRouter(prefix='/bid', tags=['Bid'])
 
-# Dependency to get the DB session
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# Create a new bid
-@bid_router.post('/', response_model=BidSchema, summary='Создать ставку')
-async def create_bid(bid: BidSchema, db: Session = Depends(get_db)):
-    bid_db = Bid(
-        auction_id=bid.auction_id,
-        user_id=bid.user_id,
-        amount=bid.amount,
-        date_registered=bid.date_registered
-    )
-    db.add(bid_db)
-    db.commit()
-    db.refresh(bid_db)
-    return bid_db
+
+# Create a new bid; in stream mode a bid still queued after BID_STREAM_WAIT gets 202 with its request id
+@bid_router.post('/', dependencies=[Depends(bid_limit)], response_model=BidSchema, summary='Создать ставку')
+async def create_bid(bid: BidSchema, db: AsyncSession = Depends(get_db)):
+    if BID_INGEST == 'stream':
+        return await bid_ingestor.submit(db, bid.auction_id, bid.user_id, bid.amount)
+    return await place_bid(db, bid.auction_id, bid.user_id, bid.amount)
+
+# Result of a bid submitted through the stream
+@bid_router.get('/requests/{request_id}', response_model=BidSchema, summary='Результат ставки по ID запроса')
+async def bid_request(request_id: str):
+    return await bid_ingestor.result(request_id)
+
+# Set or raise an automatic maximum bid
+@bid_router.post('/proxy', dependencies=[Depends(bid_limit)], response_model=ProxyBidSchema, summary='Автоставка')
+async def create_proxy_bid(proxy: ProxyBidSchema, db: AsyncSession = Depends(get_db)):
+    return await set_proxy(db, proxy.auction_id, proxy.user_id, proxy.max_amount)
+
+def bid_sort_columns(model):
+    return {'id': model.id, 'date_registered': model.date_registered}
+
+
+# model is Bid or BidArchive, see bid_model()
+def bid_list_query(model, auction_id: int, user_id: Optional[int] = None):
+    query = select(model).where(model.auction_id == auction_id)
+    if user_id is not None:
+        query = query.where(model.user_id == user_id)
+    return query
 
 # Get all bids for an auction
-@bid_router.get('/auction/{auction_id}', response_model=List[BidSchema], summary='Получить все ставки для аукциона')
-async def bid_list(auction_id: int, db: Session = Depends(get_db)):
-    return db.query(Bid).filter(Bid.auction_id == auction_id).all()
+@bid_router.get('/auction/{auction_id}', response_model=KeysetPage[BidSchema], summary='Получить все ставки для аукциона')
+async def bid_list(auction_id: int, user_id: Optional[int] = None,
+                   sort: Literal['id', '-id', 'date_registered', '-date_registered'] = '-date_registered',
+                   params: PageParams = Depends(), db: AsyncSession = Depends(get_db)):
+    # Live auctions read only the hot table; archived ones read bid_archive
+    model = bid_model(await db.get(Auction, auction_id))
+    page = await paginate(db, bid_list_query(model, auction_id, user_id), model, sort, bid_sort_columns(model), params)
+    return fast_response(KeysetPage[BidSchema], page)
+
+# Live feed of accepted bids and status changes for an auction
+@bid_router.websocket('/auction/{auction_id}/ws')
+async def bid_stream(websocket: WebSocket, auction_id: int):
+    await websocket.accept()
+    queue = await broadcaster.subscribe(auction_id)
+
+    async def send():
+        while True:
+            await websocket.send_text(await queue.get())
+
+    # Clients send nothing, but only a pending receive notices a disconnect (or the
+    # server closing the socket on shutdown) while the auction is quiet
+    async def receive():
+        while (await websocket.receive())['type'] != 'websocket.disconnect':
+            pass
+
+    tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await broadcaster.unsubscribe(auction_id, queue)
 
 # Get a bid by ID
 @bid_router.get('/{bid_id}', response_model=BidSchema, summary='Получить ставку по ID')
-async def bid_detail(bid_id: int, db: Session = Depends(get_db)):
-    bid = db.query(Bid).filter(Bid.id == bid_id).first()
+async def bid_detail(bid_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    async def load():
+        bid = await db.get(Bid, bid_id) or await db.scalar(select(BidArchive).where(BidArchive.id == bid_id))
+        return serialize(BidSchema, bid) if bid else None
 
-    if bid is None:
+    body = await read_through(cache_key('bid', bid_id), load)
+    if body is None:
         raise HTTPException(status_code=404, detail='Ставка не найдена')
-    return bid
+    return json_response(request, body)
 
 # Delete a bid
-@bid_router.delete('/{bid_id}', summary='Удалить ставку')
-async def bid_delete(bid_id: int, db: Session = Depends(get_db)):
-    bid_db = db.query(Bid).filter(Bid.id == bid_id).first()
+@bid_router.delete('/{bid_id}', dependencies=[Depends(write_limit)], summary='Удалить ставку')
+async def bid_delete(bid_id: int, db: AsyncSession = Depends(get_db)):
+    bid_db = await db.get(Bid, bid_id)
 
     if bid_db is None:
         raise HTTPException(status_code=404, detail='Ставка не найдена')
 
-    db.delete(bid_db)
-    db.commit()
+    await db.delete(bid_db)
+    await db.flush()
+    await recalculate_auction(db, bid_db.auction_id)
+    await db.commit()
+    await invalidate(cache_key('bid', bid_id), cache_key('auction', bid_db.auction_id),
+                     *leaderboard_keys(bid_db.auction_id))
     return {'message': 'Ставка удалена'}
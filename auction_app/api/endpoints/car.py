@@ -1,27 +1,29 @@
-from typing import List
-
-from fastapi import Depends, HTTPException, APIRouter
-from sqlalchemy.orm import Session
-
-from auction_app.db.database import SessionLocal
-from auction_app.db.models import Car
-from auction_app.db.schema import CarSchema
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import Depends, HTTPException, APIRouter, File, Query, Request, UploadFile
+from sqlalchemy import func, literal_column, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auction_app.api.pagination import KeysetPage, PageParams, paginate
+from auction_app.config import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, SEARCH_CONFIG, SEARCH_MAX_PAGE, SEARCH_BRAND_FACETS
+from auction_app.db.database import get_db
+from auction_app.db.models import Auction, Car, FuelType, Transmission, car_document
+from auction_app.db.schema import CarSchema, CarSearchSchema, CarImportReportSchema
+from auction_app.services.archive import bid_cache_keys
+from auction_app.services.cache import cache_key, invalidate, json_response, read_through, serialize
+from auction_app.services.car_import import import_cars
+from auction_app.services.images import store_image
+from auction_app.services.leaderboard import leaderboard_keys
+from auction_app.services.rate_limit import write_limit
+from auction_app.services.serialization import fast_response
 
 car_router = APIRouter(prefix='/car', tags=['Car'])
 
 
-
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 # Create a new car
-@car_router.post('/', response_model=CarSchema, summary='Создать машину')
-async def create_car(car: CarSchema, db: Session = Depends(get_db)):
+@car_router.post('/', dependencies=[Depends(write_limit)], response_model=CarSchema, summary='Создать машину')
+async def create_car(car: CarSchema, db: AsyncSession = Depends(get_db)):
     car_db = Car(
         brand=car.brand,
         model=car.model,
@@ -35,31 +37,62 @@ async def create_car(car: CarSchema, db: Session = Depends(get_db)):
         seller_id=car.seller_id
     )
     db.add(car_db)
-    db.commit()
-    db.refresh(car_db)
+    await db.commit()
+    await db.refresh(car_db)
     return car_db
 
 
-# Get all cars
-@car_router.get('/', response_model=List[CarSchema], summary='Получить все машины')
-async def car_list(db: Session = Depends(get_db)):
-    return db.query(Car).all()
+# Bulk import of cars from a streamed NDJSON (default) or CSV (Content-Type: text/csv) body
+@car_router.post('/bulk', dependencies=[Depends(write_limit)], response_model=CarImportReportSchema, summary='Массовый импорт машин')
+async def car_bulk_import(request: Request, db: AsyncSession = Depends(get_db)):
+    fmt = 'csv' if 'csv' in request.headers.get('content-type', '') else 'ndjson'
+    return await import_cars(db, request.stream(), fmt)
+
+
+CAR_SORT_COLUMNS = {'id': Car.id}
+
+
+def car_list_query(brand: Optional[str] = None, fuel_type: Optional[FuelType] = None,
+                   transmission: Optional[Transmission] = None, seller_id: Optional[int] = None):
+    query = select(Car)
+    if brand:
+        query = query.where(Car.brand == brand)
+    if fuel_type:
+        query = query.where(Car.fuel_type == fuel_type)
+    if transmission:
+        query = query.where(Car.transmission == transmission)
+    if seller_id is not None:
+        query = query.where(Car.seller_id == seller_id)
+    return query
+
+
+# Get cars page by page
+@car_router.get('/', response_model=KeysetPage[CarSchema], summary='Получить все машины')
+async def car_list(brand: Optional[str] = None, fuel_type: Optional[FuelType] = None,
+                   transmission: Optional[Transmission] = None, seller_id: Optional[int] = None,
+                   sort: Literal['id', '-id'] = '-id', params: PageParams = Depends(),
+                   db: AsyncSession = Depends(get_db)):
+    query = car_list_query(brand, fuel_type, transmission, seller_id)
+    return fast_response(KeysetPage[CarSchema], await paginate(db, query, Car, sort, CAR_SORT_COLUMNS, params))
 
 
 # Get a car by ID
 @car_router.get('/{car_id}', response_model=CarSchema, summary='Получить машину по ID')
-async def car_detail(car_id: int, db: Session = Depends(get_db)):
-    car = db.query(Car).filter(Car.id == car_id).first()
+async def car_detail(car_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    async def load():
+        car = await db.get(Car, car_id)
+        return serialize(CarSchema, car) if car else None
 
-    if car is None:
+    body = await read_through(cache_key('car', car_id), load)
+    if body is None:
         raise HTTPException(status_code=404, detail='Машина не найдена')
-    return car
+    return json_response(request, body)
 
 
 # Update a car
-@car_router.put('/{car_id}', response_model=CarSchema, summary='Обновить машину')
-async def car_update(car_id: int, car: CarSchema, db: Session = Depends(get_db)):
-    car_db = db.query(Car).filter(Car.id == car_id).first()
+@car_router.put('/{car_id}', dependencies=[Depends(write_limit)], response_model=CarSchema, summary='Обновить машину')
+async def car_update(car_id: int, car: CarSchema, db: AsyncSession = Depends(get_db)):
+    car_db = await db.get(Car, car_id)
 
     if car_db is None:
         raise HTTPException(status_code=404, detail='Машина не найдена')
@@ -72,48 +105,119 @@ async def car_update(car_id: int, car: CarSchema, db: Session = Depends(get_db))
     car_db.mileage = car.mileage
     car_db.price = car.price
     car_db.description = car.description
+    if car.image != car_db.image:
+        # The thumbnail belongs to the uploaded photo; a replaced image URL has none
+        car_db.thumbnail = None
     car_db.image = car.image
     car_db.seller_id = car.seller_id
 
     db.add(car_db)
-    db.commit()
-    db.refresh(car_db)
+    await db.commit()
+    await db.refresh(car_db)
+    await invalidate(cache_key('car', car_id))
+    return car_db
+
+
+# Upload a car photo; the stored file and its thumbnail are shared by identical uploads
+@car_router.post('/{car_id}/image', dependencies=[Depends(write_limit)], response_model=CarSchema, summary='Загрузить фото машины')
+async def car_image_upload(car_id: int, file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
+    car_db = await db.get(Car, car_id)
+
+    if car_db is None:
+        raise HTTPException(status_code=404, detail='Машина не найдена')
+
+    urls = await store_image(file)
+    car_db.image = urls['image']
+    car_db.thumbnail = urls['thumbnail']
+    await db.commit()
+    await invalidate(cache_key('car', car_id))
     return car_db
 
 
 # Delete a car
-@car_router.delete('/{car_id}', summary='Удалить машину')
-async def car_delete(car_id: int, db: Session = Depends(get_db)):
-    car_db = db.query(Car).filter(Car.id == car_id).first()
+@car_router.delete('/{car_id}', dependencies=[Depends(write_limit)], summary='Удалить машину')
+async def car_delete(car_id: int, db: AsyncSession = Depends(get_db)):
+    car_db = await db.get(Car, car_id)
 
     if car_db is None:
         raise HTTPException(status_code=404, detail='Машина не найдена')
 
-    db.delete(car_db)
-    db.commit()
+    auction_id = await db.scalar(select(Auction.id).where(Auction.car_id == car_id))
+    bid_keys = await bid_cache_keys(db, auction_id) if auction_id is not None else []
+    await db.delete(car_db)
+    await db.commit()
+    if auction_id is not None:
+        await invalidate(cache_key('car', car_id), cache_key('auction', auction_id), *leaderboard_keys(auction_id),
+                         *bid_keys)
+    else:
+        await invalidate(cache_key('car', car_id))
     return {'message': 'Машина удалена'}
 
 
-# Search for cars by brand, model, and fuel type
-@car_router.get('/search/', response_model=List[CarSchema], summary='Поиск машин')
-async def search_car(brand: str = '', model: str = '', fuel_type: str = '', db: Session = Depends(get_db)):
-    query = db.query(Car)
-
-    # If brand is provided, filter by brand
+# Search for cars: full-text query, trigram brand/model match, range filters and facets
+@car_router.get('/search/', response_model=CarSearchSchema, summary='Поиск машин')
+async def search_car(q: str = '', brand: str = '', model: str = '',
+                     fuel_type: Optional[FuelType] = None, transmission: Optional[Transmission] = None,
+                     year_from: Optional[int] = Query(None, ge=1900, le=2100),
+                     year_to: Optional[int] = Query(None, ge=1900, le=2100),
+                     price_min: Optional[float] = None, price_max: Optional[float] = None,
+                     mileage_max: Optional[int] = None,
+                     page: int = Query(1, ge=1, le=SEARCH_MAX_PAGE),
+                     size: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+                     db: AsyncSession = Depends(get_db)):
+    postgres = db.bind.dialect.name == 'postgresql'
+    filters = []
+    rank = None
+
+    if q:
+        if postgres:
+            ts_query = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), q)
+            filters.append(car_document().op('@@')(ts_query))
+            rank = func.ts_rank(car_document(), ts_query)
+        else:
+            filters.append(or_(Car.brand.ilike(f'%{q}%'), Car.model.ilike(f'%{q}%'),
+                               Car.description.ilike(f'%{q}%')))
+
+    # ilike on brand/model is served by the pg_trgm GIN indexes
     if brand:
-        query = query.filter(Car.brand.ilike(f'%{brand}%'))
-
-    # If model is provided, filter by model
+        filters.append(Car.brand.ilike(f'%{brand}%'))
     if model:
-        query = query.filter(Car.model.ilike(f'%{model}%'))
-
-    # If fuel_type is provided, filter by fuel type
+        filters.append(Car.model.ilike(f'%{model}%'))
+    if transmission:
+        filters.append(Car.transmission == transmission)
+    if year_from is not None:
+        filters.append(Car.year >= datetime(year_from, 1, 1))
+    if year_to is not None:
+        filters.append(Car.year < datetime(year_to + 1, 1, 1))
+    if price_min is not None:
+        filters.append(Car.price >= price_min)
+    if price_max is not None:
+        filters.append(Car.price <= price_max)
+    if mileage_max is not None:
+        filters.append(Car.mileage <= mileage_max)
+
+    # Fuel type facet ignores its own filter so every option keeps its count
+    fuel_rows = (await db.execute(
+        select(Car.fuel_type, func.count()).where(*filters).group_by(Car.fuel_type)
+    )).all()
     if fuel_type:
-        query = query.filter(Car.fuel_type == fuel_type)
-
-    cars = query.all()
-
-    if not cars:
-        raise HTTPException(status_code=404, detail='Машины не найдены')
-
-    return cars
+        filters.append(Car.fuel_type == fuel_type)
+    brand_rows = (await db.execute(
+        select(Car.brand, func.count()).where(*filters).group_by(Car.brand)
+        .order_by(func.count().desc()).limit(SEARCH_BRAND_FACETS)
+    )).all()
+
+    order = [rank.desc(), Car.id.desc()] if rank is not None else [Car.id.desc()]
+    cars = (await db.scalars(
+        select(Car).where(*filters).order_by(*order).offset((page - 1) * size).limit(size)
+    )).all()
+
+    fuel_counts = {row[0].value: row[1] for row in fuel_rows}
+    return fast_response(CarSearchSchema, {
+        'items': cars,
+        'total': fuel_counts.get(fuel_type.value, 0) if fuel_type else sum(fuel_counts.values()),
+        'facets': {
+            'fuel_type': fuel_counts,
+            'brand': {row[0]: row[1] for row in brand_rows},
+        },
+    })
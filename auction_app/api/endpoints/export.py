@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Literal, Optional
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from auction_app.config import EXPORT_BATCH_SIZE
+from auction_app.db.database import AsyncSessionLocal
+from auction_app.db.models import Auction, Bid, BidArchive, Car
+
+export_router = APIRouter(prefix='/export', tags=['Export'])
+
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def _value(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _encode(columns, rows, fmt: str) -> str:
+    if fmt == 'csv':
+        out = io.StringIO()
+        csv.writer(out).writerows([[_value(v) for v in row] for row in rows])
+        return out.getvalue()
+    return ''.join(json.dumps({c: _value(v) for c, v in zip(columns, row)}, ensure_ascii=False) + '\n' for row in rows)
+
+
+# Rows come from a server-side cursor in batches, so memory does not grow with the export
+async def _stream(table, query, fmt: str):
+    columns = [column.name for column in table.columns]
+    if fmt == 'csv':
+        yield _encode(columns, [columns], fmt)
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield _encode(columns, rows, fmt)
+
+
+def _response(table, query, fmt: str, name: str):
+    return StreamingResponse(_stream(table, query, fmt), media_type=MEDIA_TYPES[fmt],
+                             headers={'Content-Disposition': f'attachment; filename={name}.{fmt}'})
+
+
+# Export cars, optionally only those with id > since_id
+@export_router.get('/cars', summary='Экспорт машин')
+async def export_cars(format: Literal['ndjson', 'csv'] = 'ndjson', since_id: Optional[int] = None):
+    query = select(Car.__table__).order_by(Car.id)
+    if since_id is not None:
+        query = query.where(Car.id > since_id)
+    return _response(Car.__table__, query, format, 'cars')
+
+
+# Export auctions, optionally only those with id > since_id or starting after since
+@export_router.get('/auctions', summary='Экспорт аукционов')
+async def export_auctions(format: Literal['ndjson', 'csv'] = 'ndjson', since_id: Optional[int] = None,
+                          since: Optional[datetime] = None):
+    query = select(Auction.__table__).order_by(Auction.id)
+    if since_id is not None:
+        query = query.where(Auction.id > since_id)
+    if since is not None:
+        query = query.where(Auction.start_time > since)
+    return _response(Auction.__table__, query, format, 'auctions')
+
+
+# Export bids, optionally only those with id > since_id or registered after since.
+# archived=true exports the bids of archived auctions instead of the live ones.
+@export_router.get('/bids', summary='Экспорт ставок')
+async def export_bids(format: Literal['ndjson', 'csv'] = 'ndjson', since_id: Optional[int] = None,
+                      since: Optional[datetime] = None, auction_id: Optional[int] = None,
+                      archived: bool = False):
+    table = (BidArchive if archived else Bid).__table__
+    query = select(table).order_by(table.c.id)
+    if since_id is not None:
+        query = query.where(table.c.id > since_id)
+    if since is not None:
+        query = query.where(table.c.date_registered > since)
+    if auction_id is not None:
+        query = query.where(table.c.auction_id == auction_id)
+    return _response(table, query, format, 'bids_archive' if archived else 'bids')
@@ -1,23 +1,22 @@
-from typing import List
-from fastapi import Depends, HTTPException, APIRouter
-from sqlalchemy.orm import Session
-from auction_app.db.database import SessionLocal
+from typing import List, Literal, Optional
+from fastapi import Depends, HTTPException, APIRouter, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from auction_app.api.pagination import KeysetPage, PageParams, paginate
+from auction_app.db.database import get_db
 from auction_app.db.models import Feedback
-from auction_app.db.schema import FeedbackSchema
+from auction_app.config import PAGE_SIZE_MAX
+from auction_app.db.schema import FeedbackSchema, SellerRatingSchema
+from auction_app.services.cache import bump_version, cache_key, cache_version, json_response, read_through, serialize
+from auction_app.services.ratings import apply_rating, get_summaries
+from auction_app.services.rate_limit import write_limit
 
 feedback_router = APIRouter(prefix='/feedback', tags=['Feedback'])
 
-# Dependency to get the DB session
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 # Create a new feedback
-@feedback_router.post('/', response_model=FeedbackSchema, summary='Создать отзыв')
-async def create_feedback(feedback: FeedbackSchema, db: Session = Depends(get_db)):
+@feedback_router.post('/', dependencies=[Depends(write_limit)], response_model=FeedbackSchema, summary='Создать отзыв')
+async def create_feedback(feedback: FeedbackSchema, db: AsyncSession = Depends(get_db)):
     feedback_db = Feedback(
         seller_feedback_id=feedback.seller_feedback_id,
         bayer_id=feedback.bayer_id,
@@ -26,32 +25,65 @@ async def create_feedback(feedback: FeedbackSchema, db: Session = Depends(get_db
         create_date=feedback.create_date
     )
     db.add(feedback_db)
-    db.commit()
-    db.refresh(feedback_db)
+    await apply_rating(db, feedback.seller_feedback_id, feedback.rating, 1)
+    await db.commit()
+    await db.refresh(feedback_db)
+    await bump_version('feedback', feedback_db.seller_feedback_id)
     return feedback_db
 
+FEEDBACK_SORT_COLUMNS = {'id': Feedback.id, 'create_date': Feedback.create_date}
+
+
+def feedback_list_query(seller_id: int, rating: Optional[int] = None):
+    query = select(Feedback).where(Feedback.seller_feedback_id == seller_id)
+    if rating is not None:
+        query = query.where(Feedback.rating == rating)
+    return query
+
 # Get all feedback for a seller
-@feedback_router.get('/seller/{seller_id}', response_model=List[FeedbackSchema], summary='Получить все отзывы для продавца')
-async def feedback_list(seller_id: int, db: Session = Depends(get_db)):
-    return db.query(Feedback).filter(Feedback.seller_feedback_id == seller_id).all()
+@feedback_router.get('/seller/{seller_id}', response_model=KeysetPage[FeedbackSchema], summary='Получить все отзывы для продавца')
+async def feedback_list(seller_id: int, request: Request, rating: Optional[int] = None,
+                        sort: Literal['id', '-id', 'create_date', '-create_date'] = '-create_date',
+                        params: PageParams = Depends(), db: AsyncSession = Depends(get_db)):
+    async def load():
+        query = feedback_list_query(seller_id, rating)
+        page = await paginate(db, query, Feedback, sort, FEEDBACK_SORT_COLUMNS, params)
+        return serialize(KeysetPage[FeedbackSchema], page)
+
+    version = await cache_version('feedback', seller_id)
+    key = cache_key('feedback', seller_id, version, rating, sort, params.cursor, params.size)
+    return json_response(request, await read_through(key, load))
+
+# Rating summary of a seller: average, count and 1-5 histogram
+@feedback_router.get('/seller/{seller_id}/summary', response_model=SellerRatingSchema, summary='Рейтинг продавца')
+async def seller_summary(seller_id: int, db: AsyncSession = Depends(get_db)):
+    return (await get_summaries(db, [seller_id]))[seller_id]
+
+# Rating summaries of many sellers in one request
+@feedback_router.get('/sellers/summary', response_model=List[SellerRatingSchema], summary='Рейтинг нескольких продавцов')
+async def seller_summary_batch(ids: List[int] = Query(..., max_length=PAGE_SIZE_MAX), db: AsyncSession = Depends(get_db)):
+    summaries = await get_summaries(db, list(dict.fromkeys(ids)))
+    return list(summaries.values())
 
 # Get feedback by ID
 @feedback_router.get('/{feedback_id}', response_model=FeedbackSchema, summary='Получить отзыв по ID')
-async def feedback_detail(feedback_id: int, db: Session = Depends(get_db)):
-    feedback = db.query(Feedback).filter(Feedback.id == feedback_id).first()
+async def feedback_detail(feedback_id: int, db: AsyncSession = Depends(get_db)):
+    feedback = await db.get(Feedback, feedback_id)
 
     if feedback is None:
         raise HTTPException(status_code=404, detail='Отзыв не найден')
     return feedback
 
 # Delete a feedback
-@feedback_router.delete('/{feedback_id}', summary='Удалить отзыв')
-async def feedback_delete(feedback_id: int, db: Session = Depends(get_db)):
-    feedback_db = db.query(Feedback).filter(Feedback.id == feedback_id).first()
+@feedback_router.delete('/{feedback_id}', dependencies=[Depends(write_limit)], summary='Удалить отзыв')
+async def feedback_delete(feedback_id: int, db: AsyncSession = Depends(get_db)):
+    feedback_db = await db.get(Feedback, feedback_id)
 
     if feedback_db is None:
         raise HTTPException(status_code=404, detail='Отзыв не найден')
 
-    db.delete(feedback_db)
-    db.commit()
+    await db.delete(feedback_db)
+    await apply_rating(db, feedback_db.seller_feedback_id, feedback_db.rating, -1)
+    await db.commit()
+    await bump_version('feedback', feedback_db.seller_feedback_id)
     return {'message': 'Отзыв удален'}
@@ -0,0 +1,25 @@
+import re
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from auction_app.services.images import KINDS, media_path
+
+media_router = APIRouter(prefix='/media', tags=['Media'])
+
+NAME_PATTERN = re.compile(r'^[0-9a-f]{64}\.(jpg|png|webp)$')
+
+
+# Content-addressed files never change, so they are cached for a year; FileResponse
+# answers Range requests and sets ETag/Last-Modified
+@media_router.get('/{kind}/{name}', summary='Получить изображение')
+async def media_file(kind: str, name: str, request: Request):
+    if kind not in KINDS or not NAME_PATTERN.match(name):
+        raise HTTPException(status_code=404, detail='Файл не найден')
+    path = media_path(kind, name)
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail='Файл не найден')
+    response = FileResponse(path, stat_result=path.stat(),
+                            headers={'Cache-Control': 'public, max-age=31536000, immutable'})
+    if request.headers.get('if-none-match') == response.headers['etag']:
+        return Response(status_code=304, headers={'ETag': response.headers['etag'],
+                                                  'Cache-Control': response.headers['cache-control']})
+    return response
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+from auction_app.services.metrics import render_metrics
+
+metrics_router = APIRouter(tags=['Metrics'])
+
+
+# Prometheus scrape endpoint
+@metrics_router.get('/metrics', summary='Метрики Prometheus', include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,86 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from typing import Dict, Generic, List, Optional, TypeVar
+from fastapi import HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from auction_app.config import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
+
+T = TypeVar('T')
+
+# Ids are int4 columns; anything outside is rejected before it reaches the driver
+ID_MAX = 2 ** 31 - 1
+
+
+class KeysetPage(BaseModel, Generic[T]):
+    items: List[T]
+    size: int
+    next_cursor: Optional[str] = None
+
+
+class PageParams:
+    def __init__(self,
+                 cursor: Optional[str] = Query(None, description='Курсор следующей страницы'),
+                 size: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX)):
+        self.cursor = cursor
+        self.size = size
+
+
+def _encode_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_cursor(sort: str, value, row_id: int) -> str:
+    raw = json.dumps([sort, _encode_value(value), row_id])
+    return urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, sort: str, column):
+    try:
+        cursor_sort, value, row_id = json.loads(urlsafe_b64decode(cursor.encode()))
+        python_type = column.type.python_type
+        if python_type is datetime:
+            value = datetime.fromisoformat(value)
+        # bool is an int too, but no sort column holds one
+        if not isinstance(row_id, int) or isinstance(row_id, bool) or not 0 <= row_id <= ID_MAX:
+            raise ValueError(row_id)
+        if python_type is not datetime and (not isinstance(value, (int, float)) or isinstance(value, bool)):
+            raise ValueError(value)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail='Неверный курсор')
+    if cursor_sort != sort:
+        raise HTTPException(status_code=400, detail='Курсор не соответствует сортировке')
+    return value, row_id
+
+
+# Statement for one keyset page over (sort column, id); sort is a key of sort_columns,
+# prefixed with '-' for desc. One extra row is fetched to tell whether a next page exists.
+def page_query(query: Select, model, sort: str, sort_columns: Dict[str, object], params: PageParams) -> Select:
+    descending = sort.startswith('-')
+    column = sort_columns[sort.lstrip('-')]
+    key = [model.id] if column is model.id else [column, model.id]
+
+    if params.cursor:
+        value, row_id = decode_cursor(params.cursor, sort, column)
+        if column is model.id:
+            left, right = model.id, row_id
+        else:
+            left, right = tuple_(column, model.id), tuple_(value, row_id)
+        query = query.where(left < right if descending else left > right)
+
+    return query.order_by(*[c.desc() if descending else c.asc() for c in key]).limit(params.size + 1)
+
+
+async def paginate(db: AsyncSession, query: Select, model, sort: str,
+                   sort_columns: Dict[str, object], params: PageParams) -> dict:
+    column = sort_columns[sort.lstrip('-')]
+    rows = (await db.scalars(page_query(query, model, sort, sort_columns, params))).all()
+
+    next_cursor = None
+    if len(rows) > params.size:
+        rows = rows[:params.size]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, getattr(last, column.key), last.id)
+    return {'items': rows, 'size': len(rows), 'next_cursor': next_cursor}
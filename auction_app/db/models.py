@@ -1,12 +1,13 @@
-from sqlalchemy import Integer, String, Enum, ForeignKey, Text, DECIMAL, DateTime 
+from sqlalchemy import Integer, String, Enum, ForeignKey, Text, DECIMAL, DateTime, Index, UniqueConstraint
 from auction_app.db.database import Base 
 from typing import Optional, List  
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from enum import Enum as PyEnum
 from datetime import datetime, date
-from passlib.hash import bcrypt
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, literal_column, text, event, DDL
+from auction_app.config import SEARCH_CONFIG
+from auction_app.services.passwords import password_hasher
 
 
 class RoleChoices(str, PyEnum):
@@ -64,12 +65,13 @@ class UserProfile(Base):
         cascade='all, delete-orphan',
         foreign_keys='Feedback.bayer_id'
     )
+    rating: Mapped[Optional['SellerRating']] = relationship('SellerRating', viewonly=True)
 
-    def set_passwords(self, password: str):
-        self.hashed_password = bcrypt.hash(password)
+    async def set_passwords(self, password: str):
+        self.hashed_password = await password_hasher.hash(password)
 
-    def check_password(self, password: str):
-        return bcrypt.verify(password, self.hashed_password)
+    async def check_password(self, password: str):
+        return await password_hasher.verify(password, self.hashed_password)
 
     def __str__(self):
         return f'{self.username}'
@@ -77,6 +79,9 @@ class UserProfile(Base):
 
 class RefreshToken(Base):
     __tablename__ = 'refresh_token'
+    __table_args__ = (
+        Index('ix_refresh_token_user_id', 'user_id'),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     token: Mapped[str] = mapped_column(String, unique=True, nullable=False)
     created_data: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -86,6 +91,9 @@ class RefreshToken(Base):
 
 class Car(Base):
     __tablename__ = 'car'
+    __table_args__ = (
+        Index('ix_car_seller_id', 'seller_id'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     brand: Mapped[str] = mapped_column(String(40))
@@ -97,6 +105,7 @@ class Car(Base):
     price: Mapped[float] = mapped_column(DECIMAL(10, 2))
     description: Mapped[str] = mapped_column(Text)
     image: Mapped[str] = mapped_column(String)
+    thumbnail: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     seller_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'))
     seller: Mapped['UserProfile'] = relationship(UserProfile, back_populates='seller_profile')
 
@@ -104,8 +113,32 @@ class Car(Base):
                                                   cascade='all, delete-orphan', uselist=False)
 
 
+# Full-text document; rendered with literals so Postgres matches the ix_car_search expression index
+def car_document():
+    space = literal_column("' '")
+    # text() rather than literal_column() for the config, so the index below binds to the car table
+    return func.to_tsvector(text(f"'{SEARCH_CONFIG}'::regconfig"),
+                            Car.brand.op('||')(space).op('||')(Car.model).op('||')(space).op('||')(Car.description))
+
+
+# Search indexes (migration 8c4f2d6e1a73); full-text and trigram ones exist only on Postgres
+Index('ix_car_search', car_document(), postgresql_using='gin').ddl_if(dialect='postgresql')
+Index('ix_car_brand_trgm', Car.brand, postgresql_using='gin',
+      postgresql_ops={'brand': 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+Index('ix_car_model_trgm', Car.model, postgresql_using='gin',
+      postgresql_ops={'model': 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+Index('ix_car_price', Car.price)
+Index('ix_car_year', Car.year)
+event.listen(Car.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+
 class Auction(Base):
     __tablename__ = 'auction'
+    __table_args__ = (
+        Index('ix_auction_status_end_time', 'status', 'end_time'),
+        Index('ix_auction_end_time', 'end_time', 'id'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     car_id: Mapped[int] = mapped_column(ForeignKey('car.id'), unique=True)
@@ -115,13 +148,24 @@ class Auction(Base):
     start_time: Mapped[datetime] = mapped_column(DateTime)
     end_time: Mapped[datetime] = mapped_column(DateTime)
     status: Mapped[StatusCar] = mapped_column(Enum(StatusCar), default=StatusCar.active)
+    current_price: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    bid_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    leader_id: Mapped[Optional[int]] = mapped_column(ForeignKey('user_profile.id', ondelete='SET NULL'), nullable=True)
+    # Set when the auction's bids were moved to bid_archive
+    winning_bid_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    archived_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
-    bid_auction: Mapped['Bid'] = relationship("Bid", back_populates='auction',
-                                              cascade='all, delete-orphan')
+    bid_auction: Mapped[List['Bid']] = relationship("Bid", back_populates='auction',
+                                                    cascade='all, delete-orphan')
 
 
 class Bid(Base):
     __tablename__ = 'bid'
+    __table_args__ = (
+        Index('ix_bid_auction_registered', 'auction_id', 'date_registered', 'id'),
+        Index('ix_bid_auction_amount', 'auction_id', 'amount'),
+        Index('ix_bid_user_id', 'user_id'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     auction_id: Mapped[int] = mapped_column(ForeignKey('auction.id'))
@@ -132,8 +176,55 @@ class Bid(Base):
     date_registered: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
+# Bids of finished auctions, moved out of the hot bid table by the archiver.
+# On Postgres it is range-partitioned by month of date_registered.
+class BidArchive(Base):
+    __tablename__ = 'bid_archive'
+    __table_args__ = (
+        Index('ix_bid_archive_auction_registered', 'auction_id', 'date_registered', 'id'),
+        Index('ix_bid_archive_auction_amount', 'auction_id', 'amount'),
+        {'postgresql_partition_by': 'RANGE (date_registered)'},
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    auction_id: Mapped[int] = mapped_column(ForeignKey('auction.id', ondelete='CASCADE'))
+    user_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id', ondelete='CASCADE'))
+    amount: Mapped[int] = mapped_column(Integer)
+    date_registered: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+
+
+# Automatic bidding up to max_amount on behalf of the user, one per user and auction
+class ProxyBid(Base):
+    __tablename__ = 'proxy_bid'
+    __table_args__ = (
+        UniqueConstraint('auction_id', 'user_id', name='uq_proxy_bid_auction_user'),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    auction_id: Mapped[int] = mapped_column(ForeignKey('auction.id', ondelete='CASCADE'))
+    user_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id', ondelete='CASCADE'))
+    max_amount: Mapped[int] = mapped_column(Integer)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+# Strongest proxies of an auction first; ties go to the earlier proxy
+Index('ix_proxy_bid_auction_max', ProxyBid.auction_id, ProxyBid.max_amount.desc(), ProxyBid.created_at)
+
+
+# Last stream entry applied per ingestion shard, committed with the bids it covers
+class BidStreamOffset(Base):
+    __tablename__ = 'bid_stream_offset'
+
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    last_id: Mapped[str] = mapped_column(String(32))
+
+
 class Feedback(Base):
     __tablename__ = 'feedback'
+    __table_args__ = (
+        Index('ix_feedback_seller_create_date', 'seller_feedback_id', 'create_date', 'id'),
+        Index('ix_feedback_bayer_id', 'bayer_id'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     seller_feedback_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'))
@@ -148,3 +239,15 @@ class Feedback(Base):
     text: Mapped[str] = mapped_column(Text)
     create_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+
+class SellerRating(Base):
+    __tablename__ = 'seller_rating'
+
+    seller_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id', ondelete='CASCADE'), primary_key=True)
+    rating_count: Mapped[int] = mapped_column(Integer, default=0)
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0)
+    rating_1: Mapped[int] = mapped_column(Integer, default=0)
+    rating_2: Mapped[int] = mapped_column(Integer, default=0)
+    rating_3: Mapped[int] = mapped_column(Integer, default=0)
+    rating_4: Mapped[int] = mapped_column(Integer, default=0)
+    rating_5: Mapped[int] = mapped_column(Integer, default=0)
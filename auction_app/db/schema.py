@@ -1,5 +1,5 @@
 from datetime import datetime, date
-from typing import Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, EmailStr, Field
 from auction_app.db.models import RoleChoices, FuelType, Transmission, StatusCar
 
@@ -26,6 +26,39 @@ class CarSchema(BaseModel):
     description: str
     image: str
     seller_id: int
+    thumbnail: Optional[str] = None
+
+
+class CarImportSchema(CarSchema):
+    id: Optional[int] = None
+    # Limits of the car table's columns, so such rows fail validation instead of the insert
+    brand: str = Field(max_length=40)
+    model: str = Field(max_length=40)
+    mileage: int = Field(ge=0, le=2 ** 31 - 1)
+    price: float = Field(ge=0, lt=10 ** 8)
+    seller_id: int = Field(gt=0, le=2 ** 31 - 1)
+
+
+class CarImportErrorSchema(BaseModel):
+    row: int
+    error: str
+
+
+class CarImportReportSchema(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[CarImportErrorSchema]
+
+
+class CarFacetsSchema(BaseModel):
+    fuel_type: Dict[str, int]
+    brand: Dict[str, int]
+
+
+class CarSearchSchema(BaseModel):
+    items: List[CarSchema]
+    total: int
+    facets: CarFacetsSchema
 
 
 class AuctionSchema(BaseModel):
@@ -36,6 +69,11 @@ class AuctionSchema(BaseModel):
     start_time: datetime
     end_time: datetime
     status: StatusCar
+    current_price: Optional[int] = None
+    bid_count: int = 0
+    leader_id: Optional[int] = None
+    winning_bid_id: Optional[int] = None
+    archived_at: Optional[datetime] = None
 
 
 class BidSchema(BaseModel):
@@ -46,10 +84,47 @@ class BidSchema(BaseModel):
     date_registered: datetime
 
 
+class LeaderboardEntrySchema(BaseModel):
+    user_id: int
+    amount: int
+
+
+class AuctionPriceSchema(BaseModel):
+    auction_id: int
+    current_price: Optional[int]
+
+
+class ProxyBidSchema(BaseModel):
+    id: int
+    auction_id: int
+    user_id: int
+    max_amount: int = Field(gt=0)
+    created_at: Optional[datetime] = None
+
+
 class FeedbackSchema(BaseModel):
     id: int
     seller_feedback_id: int
     bayer_id: int
-    rating: int
+    rating: int = Field(ge=1, le=5)
     text: str
     create_date: datetime
+
+
+class SellerRatingSchema(BaseModel):
+    seller_id: int
+    average: Optional[float]
+    count: int
+    histogram: Dict[int, int]
+
+
+class SellerSummarySchema(BaseModel):
+    id: int
+    username: str
+    rating: SellerRatingSchema
+
+
+class AuctionViewSchema(AuctionSchema):
+    car: CarSchema
+    seller: SellerSummarySchema
+    top_bids: List[BidSchema]
@@ -1,37 +1,52 @@
 import fastapi
 import uvicorn
 from fastapi import FastAPI
-import redis.asyncio as redis
 from contextlib import asynccontextmanager
 from fastapi_limiter import FastAPILimiter
 from auction_app.admin.setup import setup_admin
-from auction_app.db.database import SessionLocal
-from auction_app.api.endpoints import auth, car, auction, bid, feedback
+from auction_app.config import BID_INGEST, SESSION_SECRET, WEB_HOST, WEB_PORT
+from auction_app.db.database import async_engine
+from auction_app.services.redis_client import init_redis
+from auction_app.services.events import broadcaster
+from auction_app.services.scheduler import scheduler
+from auction_app.services.archive import archiver
+from auction_app.services.ingest import bid_ingestor
+from auction_app.services.passwords import password_hasher
+from auction_app.services import images
+from auction_app.services.images import UploadLimitMiddleware
+from auction_app.services.metrics import MetricsMiddleware, runtime_collector
+from auction_app.services.idempotency import IdempotencyMiddleware
+from auction_app.api.endpoints import auth, car, auction, bid, feedback, export, media, metrics
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi_pagination import add_pagination
 
 
-async def init_redis():
-    return redis.Redis.from_url("redis://localhost", encoding='utf-8', decode_responses=True)
-
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     redis = await init_redis()
     await FastAPILimiter.init(redis)
+    await broadcaster.start(redis)
+    await scheduler.start(redis)
+    await archiver.start()
+    if BID_INGEST == 'stream':
+        await bid_ingestor.start(redis)
     yield
+    await bid_ingestor.stop()
+    await archiver.stop()
+    await scheduler.stop()
+    await broadcaster.stop()
     await redis.aclose()
+    await async_engine.dispose()
+    password_hasher.shutdown()
+    images.shutdown()
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 auction_app = fastapi.FastAPI(title='Auction site', lifespan=lifespan)
-auction_app.add_middleware(SessionMiddleware, secret_key='SECRET_KEY')
+auction_app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET)
+auction_app.add_middleware(IdempotencyMiddleware)
+auction_app.add_middleware(UploadLimitMiddleware)
+auction_app.add_middleware(MetricsMiddleware)
+runtime_collector.password_hasher = password_hasher
 
 setup_admin(auction_app)
 add_pagination(auction_app)
@@ -41,7 +56,11 @@ auction_app.include_router(car.car_router)
 auction_app.include_router(auction.auction_router)
 auction_app.include_router(bid.bid_router)
 auction_app.include_router(feedback.feedback_router)
+auction_app.include_router(export.export_router)
+auction_app.include_router(media.media_router)
+auction_app.include_router(metrics.metrics_router)
 
 
 if __name__ == "__main__":
-    uvicorn.run(auction_app, host="127.0.0.1", port=8001)
\ No newline at end of file
+    # Single process for development; production runs python -m auction_app.serve
+    uvicorn.run(auction_app, host=WEB_HOST, port=WEB_PORT)
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""Production entry point: several uvicorn workers forked from one preloaded app.
+
+The app is imported once in the supervisor and the workers are forked from it, sharing
+one listening socket. Settings come from the environment (see config.py):
+
+    WEB_WORKERS=4 WEB_HOST=0.0.0.0 DB_MAX_CONNECTIONS=100 SECRET_KEY=... \\
+    DB_URL=postgresql://user:password@db/Auction1 REDIS_URL=redis://redis:6379/0 \\
+    python -m auction_app.serve
+
+SIGTERM or SIGINT drains the workers: they stop accepting connections, finish the
+requests in flight (up to WEB_GRACEFUL_TIMEOUT seconds), run the lifespan shutdown and
+exit. A worker that dies on its own is replaced.
+"""
+import logging
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+logger = logging.getLogger('auction_app.serve')
+
+# Exit code of a worker whose lifespan startup failed (uvicorn's own); restarting it would only loop
+BOOT_FAILED = 3
+
+
+class Supervisor:
+    def __init__(self, app, sock: socket.socket, workers: int, graceful_timeout: int):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.children = set()
+        self.stopping = False
+
+    def run(self) -> int:
+        from prometheus_client import multiprocess
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGALRM, self.kill)
+        for _ in range(self.workers):
+            self.spawn()
+        code = 0
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            self.children.discard(pid)
+            multiprocess.mark_process_dead(pid)
+            if self.stopping:
+                continue
+            if os.waitstatus_to_exitcode(status) == BOOT_FAILED:
+                logger.error('Воркер %s не запустился, остановка', pid)
+                code = BOOT_FAILED
+                self.stop(signal.SIGTERM, None)
+                continue
+            logger.warning('Воркер %s завершился (%s), перезапуск', pid, os.waitstatus_to_exitcode(status))
+            time.sleep(1)
+            self.spawn()
+        return code
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children.add(pid)
+            return
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGALRM):
+            signal.signal(sig, signal.SIG_DFL)
+        try:
+            code = self.serve()
+        except SystemExit as exc:
+            code = exc.code if isinstance(exc.code, int) else 1
+        except BaseException:
+            logger.exception('Ошибка воркера')
+            code = 1
+        os._exit(code)
+
+    def serve(self) -> int:
+        import uvicorn
+        from auction_app.db.database import async_engine, engine
+
+        # Pools were created before the fork; each worker opens its own connections
+        engine.dispose(close=False)
+        async_engine.sync_engine.dispose(close=False)
+        server = uvicorn.Server(uvicorn.Config(
+            self.app, lifespan='on', timeout_graceful_shutdown=self.graceful_timeout,
+        ))
+        server.run(sockets=[self.sock])
+        return 0 if server.started else BOOT_FAILED
+
+    def stop(self, signum, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info('Остановка %d воркеров', len(self.children))
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+        # Workers get the drain timeout plus time for the lifespan shutdown
+        signal.alarm(self.graceful_timeout + 15)
+
+    def kill(self, signum, frame):
+        for pid in self.children:
+            logger.warning('Воркер %s не остановился вовремя', pid)
+            os.kill(pid, signal.SIGKILL)
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(process)d %(levelname)s %(message)s')
+    workers = int(os.environ.setdefault('WEB_WORKERS', str(os.cpu_count() or 1)))
+    # prometheus_client picks its storage when imported and config sizes the pools from
+    # WEB_WORKERS, so both must be in the environment before the app is imported
+    metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='auction-metrics-'))
+    # Samples left by a previous run would be merged into this one's
+    for name in os.listdir(metrics_dir):
+        if name.endswith('.db'):
+            os.remove(os.path.join(metrics_dir, name))
+
+    from auction_app import config
+    from auction_app.main import auction_app
+
+    if not config.SECRET_KEY:
+        logger.error('SECRET_KEY не задан')
+        return 1
+    per_worker = config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW + config.DB_ADMIN_POOL_SIZE
+    total = workers * per_worker + config.DB_RESERVED_CONNECTIONS
+    if total > config.DB_MAX_CONNECTIONS:
+        logger.error('%d воркеров по %d соединений (+%d резерв) превышают DB_MAX_CONNECTIONS=%d',
+                     workers, per_worker, config.DB_RESERVED_CONNECTIONS, config.DB_MAX_CONNECTIONS)
+        return 1
+
+    sock = socket.socket(socket.AF_INET6 if ':' in config.WEB_HOST else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((config.WEB_HOST, config.WEB_PORT))
+    sock.listen(config.WEB_BACKLOG)
+    logger.info('%d воркеров на %s:%d, пул БД %d+%d на воркер', workers, config.WEB_HOST, config.WEB_PORT,
+                config.DB_POOL_SIZE, config.DB_MAX_OVERFLOW)
+    return Supervisor(auction_app, sock, workers, config.WEB_GRACEFUL_TIMEOUT).run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import delete, func, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from auction_app.config import ARCHIVE_AFTER_DAYS, ARCHIVE_INTERVAL, ARCHIVE_BATCH_SIZE
+from auction_app.db.database import AsyncSessionLocal
+from auction_app.db.models import Auction, Bid, BidArchive, ProxyBid, StatusCar
+from auction_app.services.cache import cache_key, invalidate
+
+logger = logging.getLogger(__name__)
+
+BID_COLUMNS = ['id', 'auction_id', 'user_id', 'amount', 'date_registered']
+
+
+def bid_model(auction: Optional[Auction]):
+    return BidArchive if auction is not None and auction.archived_at is not None else Bid
+
+
+# Cache keys of an auction's bids, live or archived; read before a delete cascades to them
+async def bid_cache_keys(db: AsyncSession, auction_id: int) -> List[str]:
+    ids = await db.scalars(select(Bid.id).where(Bid.auction_id == auction_id)
+                           .union_all(select(BidArchive.id).where(BidArchive.auction_id == auction_id)))
+    return [cache_key('bid', bid_id) for bid_id in ids]
+
+
+def partition_name(month: datetime) -> str:
+    return f'bid_archive_y{month.year}m{month.month:02d}'
+
+
+# Monthly partitions are created on demand for the months of the bids being archived
+async def ensure_partitions(db: AsyncSession, auction_ids: List[int]):
+    months = (await db.scalars(
+        select(func.date_trunc('month', Bid.date_registered)).where(Bid.auction_id.in_(auction_ids)).distinct()
+    )).all()
+    for month in months:
+        upper = (month + timedelta(days=32)).replace(day=1)
+        await db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF bid_archive "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+        ))
+
+
+# Moves the bids of one batch of finished auctions to bid_archive and stores the
+# winning bid, count and final price on each auction. Rows are locked with SKIP LOCKED,
+# so every worker can run the archiver without picking the same auctions.
+async def archive_batch() -> int:
+    cutoff = datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    async with AsyncSessionLocal() as db:
+        ids = (await db.scalars(
+            select(Auction.id)
+            .where(Auction.status.in_([StatusCar.completed, StatusCar.canceled]),
+                   Auction.end_time < cutoff, Auction.archived_at.is_(None))
+            .order_by(Auction.id)
+            .limit(ARCHIVE_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        )).all()
+        if not ids:
+            return 0
+
+        ranked = select(
+            Bid.auction_id, Bid.id, Bid.user_id, Bid.amount,
+            func.count().over(partition_by=Bid.auction_id).label('bids'),
+            func.row_number().over(partition_by=Bid.auction_id, order_by=(Bid.amount.desc(), Bid.id)).label('rank'),
+        ).where(Bid.auction_id.in_(ids)).subquery()
+        winners = {row.auction_id: row for row in (await db.execute(select(ranked).where(ranked.c.rank == 1))).all()}
+
+        if db.bind.dialect.name == 'postgresql':
+            await ensure_partitions(db, ids)
+        await db.execute(insert(BidArchive).from_select(
+            BID_COLUMNS, select(*[getattr(Bid, column) for column in BID_COLUMNS]).where(Bid.auction_id.in_(ids))
+        ))
+        await db.execute(delete(Bid).where(Bid.auction_id.in_(ids)))
+        await db.execute(delete(ProxyBid).where(ProxyBid.auction_id.in_(ids)))
+
+        now = datetime.utcnow()
+        summaries = []
+        for auction_id in ids:
+            winner = winners.get(auction_id)
+            summary = {'id': auction_id, 'archived_at': now, 'bid_count': 0, 'winning_bid_id': None}
+            if winner is not None:
+                summary.update(bid_count=winner.bids, winning_bid_id=winner.id,
+                               current_price=winner.amount, leader_id=winner.user_id)
+            summaries.append(summary)
+        # Auctions with and without a winner update different columns
+        for with_winner in (True, False):
+            rows = [s for s in summaries if (s['winning_bid_id'] is not None) == with_winner]
+            if rows:
+                await db.execute(update(Auction), rows)
+        await db.commit()
+
+    await invalidate(*[cache_key('auction', auction_id) for auction_id in ids])
+    return len(ids)
+
+
+class BidArchiver:
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+    async def start(self):
+        self._running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while self._running:
+            try:
+                while self._running and await archive_batch() == ARCHIVE_BATCH_SIZE:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Ошибка архивации ставок')
+            await asyncio.sleep(ARCHIVE_INTERVAL)
+
+
+archiver = BidArchiver()
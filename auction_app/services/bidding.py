@@ -0,0 +1,212 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from auction_app.config import BID_MIN_STEP, ANTI_SNIPING_WINDOW, ANTI_SNIPING_EXTENSION
+from auction_app.db.models import Auction, Bid, ProxyBid, StatusCar
+from auction_app.services.cache import cache_key, invalidate
+from auction_app.services.events import publish_bid, publish_event
+from auction_app.services.leaderboard import record_bids
+from auction_app.services.scheduler import schedule_deadline
+
+
+def min_next_bid(auction: Auction) -> int:
+    if auction.current_price is None:
+        return auction.start_price
+    return auction.current_price + BID_MIN_STEP
+
+
+async def rejection(db: AsyncSession, auction_id: int, now: datetime) -> Tuple[int, str]:
+    auction = await db.get(Auction, auction_id, populate_existing=True)
+    if auction is None:
+        return 404, 'Аукцион не найден'
+    if auction.status != StatusCar.active or auction.end_time <= now:
+        return 400, 'Аукцион не активен'
+    if auction.start_time > now:
+        return 400, 'Аукцион еще не начался'
+    return 409, f'Минимальная ставка: {min_next_bid(auction)}'
+
+
+async def _reject(db: AsyncSession, auction_id: int, now: datetime):
+    status_code, detail = await rejection(db, auction_id, now)
+    raise HTTPException(status_code=status_code, detail=detail)
+
+
+# Accept a bid only if it beats the current high bid. The conditional UPDATE takes the
+# auction row lock for the rest of the transaction, so concurrent bids are serialized
+# by the database and the loser simply matches zero rows. A bid in the closing window
+# extends end_time in the same statement (anti-sniping). Proxies able to beat the bid
+# answer it within the same transaction.
+async def place_bid(db: AsyncSession, auction_id: int, user_id: int, amount: int) -> Bid:
+    now = datetime.utcnow()
+    applied = await apply_bid(db, auction_id, user_id, amount, now)
+    if applied is None:
+        await db.rollback()
+        await _reject(db, auction_id, now)
+    bids, extended = applied
+    await db.commit()
+    await announce(auction_id, bids, extended, now + timedelta(seconds=ANTI_SNIPING_EXTENSION))
+    return bids[0]
+
+
+# One bid inside the caller's transaction. Returns the new bids (the bid itself, then
+# the proxies' answers) and whether end_time was extended, or None if it was refused;
+# a refused bid changes nothing, so the transaction stays usable.
+async def apply_bid(db: AsyncSession, auction_id: int, user_id: int, amount: int,
+                    now: datetime) -> Optional[Tuple[List[Bid], bool]]:
+    extended_end = now + timedelta(seconds=ANTI_SNIPING_EXTENSION)
+    accepted = (await db.execute(
+        update(Auction)
+        .where(
+            Auction.id == auction_id,
+            Auction.status == StatusCar.active,
+            Auction.start_time <= now,
+            Auction.end_time > now,
+            or_(
+                and_(Auction.current_price.is_(None), Auction.start_price <= amount),
+                Auction.current_price + BID_MIN_STEP <= amount,
+            ),
+        )
+        .values(
+            current_price=amount,
+            bid_count=Auction.bid_count + 1,
+            leader_id=user_id,
+            end_time=_extended_end_time(now),
+        )
+        .returning(Auction.id, Auction.end_time)
+        .execution_options(synchronize_session=False)
+    )).first()
+    if accepted is None:
+        return None
+
+    bid_db = Bid(auction_id=auction_id, user_id=user_id, amount=amount, date_registered=now)
+    db.add(bid_db)
+    proxy_bids = await resolve_proxies(db, auction_id, user_id, amount, amount + BID_MIN_STEP, now)
+    end_time = (await _record(db, auction_id, proxy_bids, now)) if proxy_bids else accepted.end_time
+    return [bid_db, *proxy_bids], end_time == extended_end
+
+
+def _extended_end_time(now: datetime):
+    return case(
+        (Auction.end_time < now + timedelta(seconds=ANTI_SNIPING_WINDOW),
+         now + timedelta(seconds=ANTI_SNIPING_EXTENSION)),
+        else_=Auction.end_time,
+    )
+
+
+# Store bids made by proxies and move the auction's high bid to the last of them
+async def _record(db: AsyncSession, auction_id: int, bids: List[Bid], now: datetime) -> datetime:
+    db.add_all(bids)
+    return await db.scalar(
+        update(Auction)
+        .where(Auction.id == auction_id)
+        .values(current_price=bids[-1].amount, leader_id=bids[-1].user_id,
+                bid_count=Auction.bid_count + len(bids), end_time=_extended_end_time(now))
+        .returning(Auction.end_time)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def announce(auction_id: int, bids: List[Bid], extended: bool, end_time: datetime):
+    await invalidate(cache_key('auction', auction_id))
+    await record_bids(auction_id, bids)
+    for bid in bids:
+        await publish_bid(bid)
+    if extended:
+        await schedule_deadline(auction_id, end_time)
+        await publish_event(auction_id, 'extended', {'end_time': end_time})
+
+
+# Settle proxies against the standing high bid; the caller holds the auction row lock.
+# Only the leader's proxy and the two strongest other proxies matter, and both come from
+# index lookups (ix_proxy_bid_auction_max), so however far apart two maxima are, a war
+# between proxies ends here with at most two new bids: the runner-up at its maximum and
+# the winner one step above it (or at its own maximum if that is lower).
+async def resolve_proxies(db: AsyncSession, auction_id: int, leader_id: Optional[int], price: Optional[int],
+                          minimum: int, now: datetime) -> List[Bid]:
+    challengers = (await db.scalars(
+        select(ProxyBid)
+        .where(ProxyBid.auction_id == auction_id, ProxyBid.user_id != leader_id)
+        .order_by(ProxyBid.max_amount.desc(), ProxyBid.created_at)
+        .limit(2)
+    )).all()
+    if not challengers:
+        return []
+
+    # (maximum, priority, user): the standing bid wins ties, then the earlier proxy
+    candidates = [(proxy.max_amount, proxy.created_at, proxy.user_id) for proxy in challengers]
+    if leader_id is not None:
+        own = await db.scalar(
+            select(ProxyBid).where(ProxyBid.auction_id == auction_id, ProxyBid.user_id == leader_id)
+        )
+        if own is not None and own.max_amount > price:
+            candidates.append((own.max_amount, own.created_at, leader_id))
+        else:
+            candidates.append((price, datetime.min, leader_id))
+    candidates.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+
+    (top, _, winner), runner_up = candidates[0], candidates[1] if len(candidates) > 1 else None
+    bids = []
+    if runner_up is not None and runner_up[0] >= minimum:
+        amount = min(top, runner_up[0] + BID_MIN_STEP)
+        if runner_up[0] < amount:
+            bids.append(Bid(auction_id=auction_id, user_id=runner_up[2], amount=runner_up[0], date_registered=now))
+        bids.append(Bid(auction_id=auction_id, user_id=winner, amount=amount, date_registered=now))
+    elif winner != leader_id and top >= minimum:
+        bids.append(Bid(auction_id=auction_id, user_id=winner, amount=minimum, date_registered=now))
+    return bids
+
+
+# Create or raise the user's proxy, then let it bid right away
+async def set_proxy(db: AsyncSession, auction_id: int, user_id: int, max_amount: int) -> ProxyBid:
+    now = datetime.utcnow()
+    auction = await db.scalar(select(Auction).where(Auction.id == auction_id).with_for_update())
+    if auction is None:
+        raise HTTPException(status_code=404, detail='Аукцион не найден')
+    if auction.status != StatusCar.active or auction.end_time <= now:
+        raise HTTPException(status_code=400, detail='Аукцион не активен')
+    if auction.start_time > now:
+        raise HTTPException(status_code=400, detail='Аукцион еще не начался')
+    if max_amount < min_next_bid(auction):
+        raise HTTPException(status_code=409, detail=f'Минимальная ставка: {min_next_bid(auction)}')
+
+    proxy = await db.scalar(
+        select(ProxyBid).where(ProxyBid.auction_id == auction_id, ProxyBid.user_id == user_id)
+    )
+    if proxy is None:
+        proxy = ProxyBid(auction_id=auction_id, user_id=user_id, max_amount=max_amount, created_at=now)
+        db.add(proxy)
+    elif max_amount <= proxy.max_amount:
+        raise HTTPException(status_code=409, detail=f'Максимум можно только повысить: {proxy.max_amount}')
+    else:
+        proxy.max_amount = max_amount
+        proxy.created_at = now
+    await db.flush()
+
+    bids = await resolve_proxies(db, auction_id, auction.leader_id, auction.current_price, min_next_bid(auction), now)
+    end_time = (await _record(db, auction_id, bids, now)) if bids else auction.end_time
+    await db.commit()
+    if bids:
+        await announce(auction_id, bids, end_time != auction.end_time, end_time)
+    return proxy
+
+
+# Highest bid of an auction; the earliest one wins a tie
+def top_bid_query(auction_id: int):
+    return (select(Bid.amount, Bid.user_id).where(Bid.auction_id == auction_id)
+            .order_by(Bid.amount.desc(), Bid.id.asc()).limit(1))
+
+
+# Rebuild the denormalized high bid after a bid was removed
+async def recalculate_auction(db: AsyncSession, auction_id: int):
+    await db.scalar(select(Auction.id).where(Auction.id == auction_id).with_for_update())
+    top = (await db.execute(top_bid_query(auction_id))).first()
+    count = await db.scalar(select(func.count()).select_from(Bid).where(Bid.auction_id == auction_id))
+    await db.execute(
+        update(Auction).where(Auction.id == auction_id)
+        .values(current_price=top.amount if top else None,
+                leader_id=top.user_id if top else None,
+                bid_count=count)
+        .execution_options(synchronize_session=False)
+    )
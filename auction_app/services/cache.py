@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+from fastapi import Request, Response
+from redis.exceptions import RedisError
+from auction_app.config import CACHE_TTL, CACHE_LOCK_TTL, CACHE_LOCK_WAIT, CACHE_LOCK_RETRIES
+from auction_app.services.redis_client import get_redis
+from auction_app.services.serialization import FAST_JSON, dumps
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[Optional[str]]]
+
+_inflight: Dict[str, asyncio.Future] = {}
+
+# Store the loaded body only if the key was not invalidated while it was being loaded:
+# invalidate() bumps the key's generation, and a body read before that is stale
+STORE_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '') == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+_script = None
+_script_client = None
+
+
+def cache_key(name: str, *parts) -> str:
+    return ':'.join(['cache', name, *map(str, parts)])
+
+
+def _generation_key(key: str) -> str:
+    return f'{key}:gen'
+
+
+def serialize(schema, obj) -> str:
+    if FAST_JSON:
+        return dumps(schema, obj)
+    return schema.model_validate(obj, from_attributes=True).model_dump_json()
+
+
+def etag_for(body: str) -> str:
+    return '"' + hashlib.md5(body.encode()).hexdigest() + '"'
+
+
+# JSON response with an ETag; answers 304 when the client already has this body
+def json_response(request: Request, body: str) -> Response:
+    etag = etag_for(body)
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and (if_none_match == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type='application/json', headers=headers)
+
+
+# Serve the key from Redis, or load it once (per worker and across workers) and store it.
+# A loader result of None means "not found" and is not cached.
+async def read_through(key: str, loader: Loader, ttl: int = CACHE_TTL) -> Optional[str]:
+    redis = get_redis()
+    if redis is None:
+        return await loader()
+    try:
+        body = await redis.get(key)
+    except RedisError:
+        logger.warning('Кэш недоступен, чтение из БД', exc_info=True)
+        return await loader()
+    if body is not None:
+        return body
+
+    inflight = _inflight.get(key)
+    if inflight is not None:
+        return await asyncio.shield(inflight)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        body = await _load(redis, key, loader, ttl)
+    except BaseException as exc:
+        future.set_exception(exc)
+        future.exception()
+        raise
+    else:
+        future.set_result(body)
+        return body
+    finally:
+        del _inflight[key]
+
+
+async def _load(redis, key: str, loader: Loader, ttl: int) -> Optional[str]:
+    global _script, _script_client
+    lock_key = f'{key}:lock'
+    try:
+        locked = await redis.set(lock_key, '1', nx=True, ex=CACHE_LOCK_TTL)
+    except RedisError:
+        return await loader()
+
+    if not locked:
+        # Another worker is filling this key; wait for it instead of hitting the DB too
+        for _ in range(CACHE_LOCK_RETRIES):
+            await asyncio.sleep(CACHE_LOCK_WAIT)
+            body = await redis.get(key)
+            if body is not None:
+                return body
+        return await loader()
+
+    if _script_client is not redis:
+        _script = redis.register_script(STORE_SCRIPT)
+        _script_client = redis
+    try:
+        generation = await redis.get(_generation_key(key)) or ''
+    except RedisError:
+        generation = None
+    body = None
+    try:
+        body = await loader()
+        if body is not None and generation is not None:
+            await _script(keys=[key, _generation_key(key)], args=[generation, body, ttl])
+        return body
+    except RedisError:
+        logger.warning('Не удалось записать кэш %s', key, exc_info=True)
+        return body
+    finally:
+        try:
+            await redis.delete(lock_key)
+        except RedisError:
+            pass
+
+
+async def invalidate(*keys: str):
+    redis = get_redis()
+    if redis is None or not keys:
+        return
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.delete(*keys)
+            for key in keys:
+                pipe.incr(_generation_key(key))
+                pipe.expire(_generation_key(key), CACHE_TTL)
+            await pipe.execute()
+    except RedisError:
+        logger.warning('Не удалось сбросить кэш %s', keys, exc_info=True)
+
+
+# Version counters let one INCR drop every cached page of a collection
+async def cache_version(name: str, *parts) -> int:
+    redis = get_redis()
+    if redis is None:
+        return 0
+    try:
+        return int(await redis.get(cache_key(name, *parts, 'version')) or 0)
+    except RedisError:
+        return 0
+
+
+async def bump_version(name: str, *parts):
+    redis = get_redis()
+    if redis is None:
+        return
+    try:
+        await redis.incr(cache_key(name, *parts, 'version'))
+    except RedisError:
+        logger.warning('Не удалось сбросить кэш %s', name, exc_info=True)
@@ -0,0 +1,152 @@
+import csv
+import json
+from datetime import datetime, time
+from decimal import Decimal
+from typing import AsyncIterator, List, Tuple
+from asyncpg import PostgresError
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from auction_app.config import IMPORT_CHUNK_SIZE, IMPORT_MAX_ERRORS, IMPORT_MAX_LINE
+from auction_app.db.models import Car, UserProfile
+from auction_app.db.schema import CarImportSchema
+
+COLUMNS = ['brand', 'model', 'year', 'fuel_type', 'transmission', 'mileage', 'price',
+           'description', 'image', 'seller_id']
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row: int, message: str):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({'row': row, 'error': message})
+
+
+# Split a byte stream into numbered text lines without holding more than one line
+async def read_lines(stream: AsyncIterator[bytes], report: ImportReport) -> AsyncIterator[Tuple[int, str]]:
+    buffer = b''
+    number = 0
+    skipping = False
+    async for chunk in stream:
+        lines = (buffer + chunk).split(b'\n')
+        buffer = lines.pop()
+        for line in lines:
+            if skipping:
+                # Tail of an oversized line
+                skipping = False
+                continue
+            number += 1
+            yield number, line.decode('utf-8', errors='replace').rstrip('\r')
+        if len(buffer) > IMPORT_MAX_LINE:
+            if not skipping:
+                number += 1
+                report.error(number, 'Строка слишком длинная')
+                skipping = True
+            buffer = b''
+    if buffer.strip() and not skipping:
+        yield number + 1, buffer.decode('utf-8', errors='replace').rstrip('\r')
+
+
+async def read_rows(stream: AsyncIterator[bytes], fmt: str, report: ImportReport) -> AsyncIterator[Tuple[int, dict]]:
+    header = None
+    async for number, line in read_lines(stream, report):
+        if not line.strip():
+            continue
+        if fmt == 'csv':
+            # One record per line; quoted fields must not contain line breaks
+            values = next(csv.reader([line]))
+            if header is None:
+                header = values
+                continue
+            yield number, dict(zip(header, values))
+        else:
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as exc:
+                report.error(number, f'Неверный JSON: {exc.msg}')
+
+
+def validate(number: int, data, report: ImportReport):
+    try:
+        car = CarImportSchema.model_validate(data)
+    except ValidationError as exc:
+        report.error(number, '; '.join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors()))
+        return None
+    return car
+
+
+def _values(car: CarImportSchema) -> dict:
+    return {**car.model_dump(include=set(COLUMNS)), 'year': datetime.combine(car.year, time())}
+
+
+async def insert_chunk(db: AsyncSession, chunk: List[Tuple[int, CarImportSchema]], report: ImportReport):
+    seller_ids = {car.seller_id for _, car in chunk}
+    known = set((await db.scalars(select(UserProfile.id).where(UserProfile.id.in_(seller_ids)))).all())
+    rows = []
+    for number, car in chunk:
+        if car.seller_id not in known:
+            report.error(number, f'seller_id: продавец {car.seller_id} не найден')
+            continue
+        rows.append((number, car))
+    if not rows:
+        return
+
+    try:
+        if db.bind.dialect.name == 'postgresql':
+            records = [(car.brand, car.model, datetime.combine(car.year, time()), car.fuel_type.name,
+                        car.transmission.name, car.mileage, Decimal(str(car.price)), car.description,
+                        car.image, car.seller_id) for _, car in rows]
+            connection = await db.connection()
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table('car', records=records, columns=COLUMNS)
+        else:
+            await db.execute(insert(Car), [_values(car) for _, car in rows])
+        await db.commit()
+    except (PostgresError, SQLAlchemyError):
+        # One row the database refuses fails the whole chunk; redo it row by row so only
+        # that row is reported and the rest are still imported
+        await db.rollback()
+        await insert_each(db, rows, report)
+        return
+    report.inserted += len(rows)
+
+
+# The driver's own message: asyncpg errors arrive wrapped twice (SQLAlchemy, then its adapter)
+def _db_error(exc: SQLAlchemyError) -> str:
+    error = getattr(exc, 'orig', None) or exc
+    return str(error.__cause__ or error).splitlines()[0]
+
+
+async def insert_each(db: AsyncSession, rows: List[Tuple[int, CarImportSchema]], report: ImportReport):
+    for number, car in rows:
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(Car).values(**_values(car)))
+        except SQLAlchemyError as exc:
+            report.error(number, f'Ошибка базы данных: {_db_error(exc)}')
+        else:
+            report.inserted += 1
+    await db.commit()
+
+
+# Validate and insert cars chunk by chunk; bad rows are reported and skipped
+async def import_cars(db: AsyncSession, stream: AsyncIterator[bytes], fmt: str) -> dict:
+    report = ImportReport()
+    chunk = []
+    async for number, data in read_rows(stream, fmt, report):
+        car = validate(number, data, report)
+        if car is None:
+            continue
+        chunk.append((number, car))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await insert_chunk(db, chunk, report)
+            chunk = []
+    if chunk:
+        await insert_chunk(db, chunk, report)
+    return {'inserted': report.inserted, 'failed': report.failed, 'errors': report.errors}
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Optional, Set
+from redis.exceptions import RedisError
+from auction_app.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'auction:events:'
+QUEUE_SIZE = 100
+
+
+def channel_name(auction_id: int) -> str:
+    return f'{CHANNEL_PREFIX}{auction_id}'
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def publish_event(auction_id: int, event: str, data: dict):
+    redis = get_redis()
+    if redis is None:
+        return
+    message = json.dumps({'event': event, 'auction_id': auction_id, 'data': data}, default=_default)
+    try:
+        await redis.publish(channel_name(auction_id), message)
+    except RedisError:
+        # The write is already committed, a lost notification must not fail the request
+        logger.warning('Не удалось отправить событие аукциона %s', auction_id, exc_info=True)
+
+
+async def publish_bid(bid):
+    await publish_event(bid.auction_id, 'bid', {
+        'id': bid.id,
+        'user_id': bid.user_id,
+        'amount': bid.amount,
+        'date_registered': bid.date_registered,
+    })
+
+
+async def publish_status(auction):
+    await publish_event(auction.id, 'status', {
+        'status': auction.status,
+        'end_time': auction.end_time,
+        'current_price': auction.current_price,
+        'leader_id': auction.leader_id,
+    })
+
+
+# One pub/sub connection per worker; channels are subscribed while at least one local
+# client listens and messages are fanned out to the clients' queues.
+class AuctionBroadcaster:
+    def __init__(self):
+        self._listeners: Dict[int, Set[asyncio.Queue]] = {}
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._running = False
+
+    async def start(self, redis):
+        self._pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        self._running = True
+        self._task = asyncio.create_task(self._reader())
+
+    async def stop(self):
+        # redis-py may swallow a cancellation inside get_message, so the reader also
+        # checks the flag between polls
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub:
+            await self._pubsub.aclose()
+        self._listeners.clear()
+
+    async def subscribe(self, auction_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        async with self._lock:
+            listeners = self._listeners.setdefault(auction_id, set())
+            if not listeners:
+                await self._pubsub.subscribe(channel_name(auction_id))
+            listeners.add(queue)
+        return queue
+
+    async def unsubscribe(self, auction_id: int, queue: asyncio.Queue):
+        async with self._lock:
+            listeners = self._listeners.get(auction_id)
+            if listeners is None:
+                return
+            listeners.discard(queue)
+            if not listeners:
+                del self._listeners[auction_id]
+                await self._pubsub.unsubscribe(channel_name(auction_id))
+
+    async def _reader(self):
+        while self._running:
+            if not self._pubsub.subscribed:
+                await asyncio.sleep(0.1)
+                continue
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except RedisError:
+                logger.warning('Ошибка чтения pub/sub, переподключение', exc_info=True)
+                await asyncio.sleep(1)
+                continue
+            if message is None:
+                continue
+            auction_id = int(message['channel'][len(CHANNEL_PREFIX):])
+            for queue in list(self._listeners.get(auction_id, ())):
+                try:
+                    queue.put_nowait(message['data'])
+                except asyncio.QueueFull:
+                    # Slow client: drop the oldest event rather than block everyone else
+                    queue.get_nowait()
+                    queue.put_nowait(message['data'])
+
+
+broadcaster = AuctionBroadcaster()
@@ -0,0 +1,120 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+from typing import Optional
+from redis.exceptions import RedisError
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from auction_app.config import (IDEMPOTENCY_PATHS, IDEMPOTENCY_TTL, IDEMPOTENCY_LOCK_TTL, IDEMPOTENCY_WAIT,
+                                IDEMPOTENCY_RETRIES)
+from auction_app.services.rate_limit import user_of
+from auction_app.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+SKIPPED_HEADERS = {b'set-cookie', b'date', b'server'}
+
+
+def _error(status: int, detail: str, headers: Optional[dict] = None):
+    return JSONResponse({'detail': detail}, status_code=status, headers=headers)
+
+
+# Replays the stored response of a POST repeated with the same Idempotency-Key. The first
+# request holds a short lock while it runs; duplicates arriving meanwhile wait for its
+# response instead of inserting again. Keys are scoped per path and per user (or client
+# IP for anonymous calls), and reusing a key with a different body is rejected.
+class IdempotencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST' or scope['path'] not in IDEMPOTENCY_PATHS:
+            return await self.app(scope, receive, send)
+        request = Request(scope)
+        idempotency_key = request.headers.get('idempotency-key')
+        redis = get_redis()
+        if not idempotency_key or redis is None:
+            return await self.app(scope, receive, send)
+
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        fingerprint = hashlib.sha256(body).hexdigest()
+        owner = user_of(request) or (request.client.host if request.client else '')
+        key = f'idempotency:{scope["path"]}:{owner}:{idempotency_key}'
+
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            return await receive()
+
+        try:
+            stored, locked = await self._claim(redis, key)
+            for _ in range(IDEMPOTENCY_RETRIES if stored is None and not locked else 0):
+                await asyncio.sleep(IDEMPOTENCY_WAIT)
+                # The first request may finish without storing (e.g. a 500); then this one runs
+                stored, locked = await self._claim(redis, key)
+                if stored is not None or locked:
+                    break
+        except RedisError:
+            logger.warning('Ключи идемпотентности недоступны', exc_info=True)
+            return await self.app(scope, replay_receive, send)
+
+        if stored is not None:
+            return await self._replay(json.loads(stored), fingerprint, scope, receive, send)
+        if not locked:
+            response = _error(409, 'Запрос с этим Idempotency-Key еще выполняется', {'Retry-After': '1'})
+            return await response(scope, receive, send)
+
+        status, headers, chunks = 500, [], []
+
+        async def capture(message):
+            nonlocal status, headers
+            if message['type'] == 'http.response.start':
+                status, headers = message['status'], message.get('headers', [])
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture)
+            # Server errors and rate limiting are worth retrying, so they are not stored
+            if status < 500 and status != 429:
+                await redis.set(key, json.dumps({
+                    'fingerprint': fingerprint,
+                    'status': status,
+                    'headers': [[k.decode('latin-1'), v.decode('latin-1')]
+                                for k, v in headers if k.lower() not in SKIPPED_HEADERS],
+                    'body': base64.b64encode(b''.join(chunks)).decode(),
+                }), ex=IDEMPOTENCY_TTL)
+        except RedisError:
+            logger.warning('Не удалось сохранить ответ для Idempotency-Key', exc_info=True)
+        finally:
+            try:
+                await redis.delete(f'{key}:lock')
+            except RedisError:
+                pass
+
+    async def _claim(self, redis, key: str):
+        stored = await redis.get(key)
+        if stored is not None:
+            return stored, False
+        return None, bool(await redis.set(f'{key}:lock', '1', nx=True, ex=IDEMPOTENCY_LOCK_TTL))
+
+    async def _replay(self, stored: dict, fingerprint: str, scope, receive, send):
+        if stored['fingerprint'] != fingerprint:
+            response = _error(422, 'Idempotency-Key уже использован с другим запросом')
+            return await response(scope, receive, send)
+        headers = [(k.encode('latin-1'), v.encode('latin-1')) for k, v in stored['headers']]
+        headers.append((b'idempotent-replayed', b'true'))
+        await send({'type': 'http.response.start', 'status': stored['status'], 'headers': headers})
+        await send({'type': 'http.response.body', 'body': base64.b64decode(stored['body'])})
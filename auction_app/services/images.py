@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import os
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from auction_app.config import MEDIA_ROOT, IMAGE_MAX_BYTES, IMAGE_CHUNK_SIZE, IMAGE_WORKERS, THUMBNAIL_SIZE, UPLOAD_MAX_BYTES
+
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+KINDS = ('original', 'thumb')
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def media_path(kind: str, name: str) -> Path:
+    # Files are sharded by the first two hex digits of the content hash
+    return Path(MEDIA_ROOT) / kind / name[:2] / name
+
+
+def media_url(kind: str, name: str) -> str:
+    return f'/media/{kind}/{name}'
+
+
+# Runs in a worker process: validates the image and writes a JPEG thumbnail. Corrupt files
+# that pass format detection fail in the decoders with any of the errors caught below.
+def make_thumbnail(source: str, target: str) -> Optional[str]:
+    try:
+        with Image.open(source) as image:
+            image_format = image.format
+            if image_format not in FORMATS:
+                return None
+            image.thumbnail(THUMBNAIL_SIZE)
+            Path(target).parent.mkdir(parents=True, exist_ok=True)
+            image.convert('RGB').save(target, 'JPEG', quality=85, optimize=True)
+    except (OSError, ValueError, SyntaxError, struct.error, Image.DecompressionBombError):
+        return None
+    return image_format
+
+
+def _executor_pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+# Starlette spools the whole multipart body to disk before the endpoint runs, so oversized
+# uploads are refused here: up front by Content-Length, or as soon as a chunked body passes
+# the limit (FastAPI turns the HTTPException raised while reading the form into the response)
+class UploadLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        headers = Headers(scope=scope) if scope['type'] == 'http' else None
+        if headers is None or not headers.get('content-type', '').startswith('multipart/form-data'):
+            return await self.app(scope, receive, send)
+        length = headers.get('content-length', '')
+        if length.isdigit() and int(length) > UPLOAD_MAX_BYTES:
+            response = JSONResponse({'detail': 'Файл слишком большой'}, status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            received += len(message.get('body', b''))
+            if received > UPLOAD_MAX_BYTES:
+                raise HTTPException(status_code=413, detail='Файл слишком большой')
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _existing(digest: str) -> Optional[str]:
+    for ext in FORMATS.values():
+        if media_path('original', f'{digest}.{ext}').exists():
+            return f'{digest}.{ext}'
+    return None
+
+
+# Copy the upload to disk in chunks while hashing it, then keep one file per content hash
+async def store_image(upload: UploadFile) -> dict:
+    tmp_dir = Path(MEDIA_ROOT) / 'tmp'
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    tmp = tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while chunk := await upload.read(IMAGE_CHUNK_SIZE):
+            size += len(chunk)
+            if size > IMAGE_MAX_BYTES:
+                raise HTTPException(status_code=413, detail='Файл слишком большой')
+            digest.update(chunk)
+            await run_in_threadpool(tmp.write, chunk)
+        await run_in_threadpool(tmp.close)
+
+        digest = digest.hexdigest()
+        name = _existing(digest)
+        if name is None:
+            thumb = media_path('thumb', f'{digest}.jpg')
+            image_format = await asyncio.get_running_loop().run_in_executor(
+                _executor_pool(), make_thumbnail, tmp.name, str(thumb))
+            if image_format is None:
+                raise HTTPException(status_code=400, detail='Неподдерживаемое изображение')
+            name = f'{digest}.{FORMATS[image_format]}'
+            original = media_path('original', name)
+            original.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp.name, original)
+    finally:
+        tmp.close()
+        if os.path.exists(tmp.name):
+            os.unlink(tmp.name)
+
+    return {'image': media_url('original', name), 'thumbnail': media_url('thumb', f'{digest}.jpg')}
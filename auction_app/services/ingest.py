@@ -0,0 +1,315 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from redis.exceptions import LockError, RedisError, ResponseError
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from auction_app.config import (BID_STREAM_SHARDS, BID_STREAM_BATCH, BID_STREAM_BLOCK_MS, BID_STREAM_MAXLEN,
+                                BID_STREAM_OWNER_TTL, BID_STREAM_WAIT, BID_RESULT_TTL, ANTI_SNIPING_EXTENSION)
+from auction_app.db.database import AsyncSessionLocal
+from auction_app.db.models import BidStreamOffset, UserProfile
+from auction_app.db.schema import BidSchema
+from auction_app.services.bidding import announce, apply_bid, place_bid, rejection
+from auction_app.services.metrics import BID_INGEST_BATCH, BID_INGEST_SECONDS, BID_INGEST_RESULTS
+from auction_app.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+STREAM_PREFIX = 'bids:stream:'
+RESULT_PREFIX = 'bids:result:'
+REPLY_PREFIX = 'bids:replies:'
+GROUP = 'bid-appliers'
+INT4_MAX = 2 ** 31 - 1
+
+
+def stream_name(shard: int) -> str:
+    return f'{STREAM_PREFIX}{shard}'
+
+
+def shard_of(auction_id: int) -> int:
+    return auction_id % BID_STREAM_SHARDS
+
+
+def result_key(request_id: str) -> str:
+    return f'{RESULT_PREFIX}{request_id}'
+
+
+def _position(entry_id: Optional[str]) -> Tuple[int, int]:
+    if entry_id is None:
+        return (-1, -1)
+    ms, seq = entry_id.split('-')
+    return int(ms), int(seq)
+
+
+# (auction_id, user_id, amount, submitted at) or None for an entry that is not a valid bid
+def _parse(fields: dict) -> Optional[Tuple[int, int, int, datetime]]:
+    try:
+        bid = int(fields['auction_id']), int(fields['user_id']), int(fields['amount'])
+        # Deadlines are checked against the time the bid was submitted, not applied
+        now = datetime.utcfromtimestamp(float(fields['ts']))
+    except (KeyError, ValueError, OverflowError):
+        return None
+    if not all(0 < value <= INT4_MAX for value in bid):
+        return None
+    return (*bid, now)
+
+
+async def _load_offset(shard: int) -> Optional[str]:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(BidStreamOffset.last_id).where(BidStreamOffset.shard == shard))
+
+
+# Locks the shard's offset row for the rest of the transaction and returns it. A previous
+# owner whose lock expired mid-batch may still be applying the same entries; the new owner
+# waits here until that batch commits and then sees its offset.
+async def _lock_offset(db: AsyncSession, shard: int) -> str:
+    insert = pg_insert if db.bind.dialect.name == 'postgresql' else sqlite_insert
+    await db.execute(insert(BidStreamOffset).values(shard=shard, last_id='0-0').on_conflict_do_nothing(
+        index_elements=[BidStreamOffset.shard],
+    ))
+    return await db.scalar(
+        select(BidStreamOffset.last_id).where(BidStreamOffset.shard == shard).with_for_update()
+    )
+
+
+async def _save_offset(db: AsyncSession, shard: int, last_id: str):
+    await db.execute(update(BidStreamOffset).where(BidStreamOffset.shard == shard).values(last_id=last_id))
+
+
+# Applies one batch of a shard in a single transaction, in stream order. The shard's
+# offset commits with the bids, so entries redelivered after a crash between the commit
+# and XACK, or read by two owners at once, are recognised and skipped instead of being
+# applied twice. Each bid runs in its own SAVEPOINT: a bid the database refuses gets an
+# error result instead of failing the bids around it.
+async def apply_entries(shard: int, entries: List[Tuple[str, dict]], last_id: Optional[str]) -> Dict[str, dict]:
+    fresh = [(entry_id, fields) for entry_id, fields in entries if _position(entry_id) > _position(last_id)]
+    if not fresh:
+        return {}
+    outcomes = []
+    async with AsyncSessionLocal() as db:
+        stored = await _lock_offset(db, shard)
+        fresh = [(entry_id, fields) for entry_id, fields in fresh if _position(entry_id) > _position(stored)]
+        if not fresh:
+            await db.rollback()
+            return {}
+        # Pending entries trimmed by MAXLEN come back without fields; they only move the offset
+        parsed = [(fields, _parse(fields)) for _, fields in fresh if fields is not None]
+        # An unknown user would fail the bid on the foreign key, so check them up front
+        user_ids = {bid[1] for _, bid in parsed if bid is not None}
+        known = set((await db.scalars(select(UserProfile.id).where(UserProfile.id.in_(user_ids)))).all())
+        for fields, bid in parsed:
+            if bid is None:
+                outcomes.append((fields, None, None, (422, 'Некорректная ставка'), None))
+                continue
+            auction_id, user_id, amount, now = bid
+            if user_id not in known:
+                outcomes.append((fields, auction_id, None, (404, 'Пользователь не найден'), now))
+                continue
+            try:
+                async with db.begin_nested():
+                    applied = await apply_bid(db, auction_id, user_id, amount, now)
+                    if applied is not None:
+                        await db.flush()
+            except SQLAlchemyError:
+                logger.warning('Ставка %s отклонена базой данных', fields.get('request_id'), exc_info=True)
+                outcomes.append((fields, auction_id, None, (422, 'Некорректная ставка'), now))
+                continue
+            refused = await rejection(db, auction_id, now) if applied is None else None
+            outcomes.append((fields, auction_id, applied, refused, now))
+        await _save_offset(db, shard, fresh[-1][0])
+        await db.commit()
+
+    results = {}
+    by_auction = defaultdict(list)
+    for fields, auction_id, applied, refused, now in outcomes:
+        if applied is None:
+            results[fields.get('request_id')] = {'status': refused[0], 'detail': refused[1]}
+            BID_INGEST_RESULTS.labels('rejected').inc()
+            continue
+        bids, extended = applied
+        results[fields['request_id']] = {'status': 200, 'bid': BidSchema.model_validate(bids[0], from_attributes=True)
+                                         .model_dump(mode='json')}
+        by_auction[auction_id].append((bids, extended, now))
+        BID_INGEST_RESULTS.labels('accepted').inc()
+    # One cache invalidation and leaderboard update per auction instead of per bid
+    for auction_id, applied in by_auction.items():
+        extensions = [now for _, extended, now in applied if extended]
+        end_time = extensions[-1] + timedelta(seconds=ANTI_SNIPING_EXTENSION) if extensions else None
+        await announce(auction_id, [bid for bids, _, _ in applied for bid in bids], bool(extensions), end_time)
+    return results
+
+
+# Write-behind bid ingestion. Requests append bids to the stream of their auction's shard
+# and wait for the result on this worker's reply channel; each shard is consumed by a
+# single owner at a time (a Redis lock), so bids of one auction are applied in the order
+# they were submitted while different shards commit in parallel.
+class BidIngestor:
+    def __init__(self):
+        self._reply_channel = f'{REPLY_PREFIX}{uuid.uuid4().hex}'
+        self._waiters: Dict[str, asyncio.Future] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._locks = []
+        self._pubsub = None
+        self._running = False
+
+    async def start(self, redis):
+        self._pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self._reply_channel)
+        self._running = True
+        self._tasks = [asyncio.create_task(self._reader())]
+        self._tasks += [asyncio.create_task(self._consume(redis, shard)) for shard in range(BID_STREAM_SHARDS)]
+
+    async def stop(self):
+        # Consumers finish the batch in hand; a blocked read returns within BID_STREAM_BLOCK_MS
+        self._running = False
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=BID_STREAM_BLOCK_MS / 1000 + 1)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        for lock in self._locks:
+            try:
+                await lock.release()
+            except (LockError, RedisError):
+                pass
+        if self._pubsub:
+            await self._pubsub.aclose()
+        self._tasks, self._locks = [], []
+
+    async def submit(self, db: AsyncSession, auction_id: int, user_id: int, amount: int):
+        redis = get_redis()
+        if redis is None or not self._running:
+            return await place_bid(db, auction_id, user_id, amount)
+        request_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[request_id] = future
+        try:
+            await redis.xadd(stream_name(shard_of(auction_id)), {
+                'request_id': request_id,
+                'reply_to': self._reply_channel,
+                'auction_id': auction_id,
+                'user_id': user_id,
+                'amount': amount,
+                'ts': repr(time.time()),
+            }, maxlen=BID_STREAM_MAXLEN, approximate=True)
+        except RedisError:
+            # Only a failed XADD falls back: once the entry is in the stream a consumer applies it
+            self._waiters.pop(request_id, None)
+            logger.warning('Поток ставок недоступен, ставка принимается напрямую', exc_info=True)
+            return await place_bid(db, auction_id, user_id, amount)
+        try:
+            result = await asyncio.wait_for(future, BID_STREAM_WAIT)
+        except asyncio.TimeoutError:
+            return JSONResponse(status_code=202, content={'request_id': request_id, 'status': 'pending'},
+                                headers={'Location': f'/bid/requests/{request_id}'})
+        finally:
+            self._waiters.pop(request_id, None)
+        return _response(result, request_id)
+
+    async def result(self, request_id: str):
+        redis = get_redis()
+        if redis is None:
+            raise HTTPException(status_code=404, detail='Запрос не найден')
+        try:
+            stored = await redis.get(result_key(request_id))
+        except RedisError:
+            logger.warning('Не удалось прочитать результат ставки %s', request_id, exc_info=True)
+            stored = None
+        if stored is None:
+            return JSONResponse(status_code=202, content={'request_id': request_id, 'status': 'pending'})
+        return _response(json.loads(stored), request_id)
+
+    async def _reader(self):
+        while self._running:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except RedisError:
+                logger.warning('Ошибка чтения ответов потока ставок', exc_info=True)
+                await asyncio.sleep(1)
+                continue
+            if message is None:
+                continue
+            reply = json.loads(message['data'])
+            future = self._waiters.get(reply['request_id'])
+            if future is not None and not future.done():
+                future.set_result(reply['result'])
+
+    async def _consume(self, redis, shard: int):
+        stream = stream_name(shard)
+        lock = redis.lock(f'{stream}:owner', timeout=BID_STREAM_OWNER_TTL)
+        owned, backlog, last_id, renewed = False, True, None, 0.0
+        while self._running:
+            try:
+                if owned:
+                    if time.monotonic() - renewed > BID_STREAM_OWNER_TTL / 3:
+                        await lock.reacquire()
+                        renewed = time.monotonic()
+                elif await lock.acquire(blocking=False):
+                    owned, backlog, renewed = True, True, time.monotonic()
+                    self._locks.append(lock)
+                    try:
+                        await redis.xgroup_create(stream, GROUP, id='0', mkstream=True)
+                    except ResponseError:
+                        pass
+                    last_id = await _load_offset(shard)
+                else:
+                    await asyncio.sleep(1)
+                    continue
+                # The consumer name belongs to the shard, so a new owner first replays
+                # what the previous one read but never acknowledged
+                read = await redis.xreadgroup(GROUP, f'shard-{shard}', {stream: '0' if backlog else '>'},
+                                              count=BID_STREAM_BATCH, block=None if backlog else BID_STREAM_BLOCK_MS)
+                entries = read[0][1] if read else []
+                if backlog and not entries:
+                    backlog = False
+                if entries:
+                    last_id = await self._process(redis, shard, stream, entries, last_id)
+            except LockError:
+                owned = False
+                if lock in self._locks:
+                    self._locks.remove(lock)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Whatever was read stays pending; replay it from the start once recovered
+                logger.exception('Ошибка применения потока ставок %s', shard)
+                backlog = True
+                await asyncio.sleep(1)
+
+    async def _process(self, redis, shard: int, stream: str, entries, last_id: Optional[str]) -> str:
+        started = time.perf_counter()
+        results = await apply_entries(shard, entries, last_id)
+        BID_INGEST_BATCH.labels(str(shard)).observe(len(results))
+        BID_INGEST_SECONDS.labels(str(shard)).observe(time.perf_counter() - started)
+        pipe = redis.pipeline(transaction=False)
+        for _, fields in entries:
+            request_id = fields.get('request_id') if fields is not None else None
+            result = results.get(request_id) if request_id else None
+            if result is None:
+                continue
+            pipe.set(result_key(request_id), json.dumps(result), ex=BID_RESULT_TTL)
+            if 'reply_to' in fields:
+                pipe.publish(fields['reply_to'], json.dumps({'request_id': request_id, 'result': result}))
+        pipe.xack(stream, GROUP, *[entry_id for entry_id, _ in entries])
+        await pipe.execute()
+        return max(entries[-1][0], last_id or '0-0', key=_position)
+
+
+def _response(result: dict, request_id: str):
+    if result['status'] != 200:
+        raise HTTPException(status_code=result['status'], detail=result['detail'],
+                            headers={'X-Request-Id': request_id})
+    return result['bid']
+
+
+bid_ingestor = BidIngestor()
@@ -0,0 +1,137 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+from redis.exceptions import RedisError
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from auction_app.config import LEADERBOARD_TTL
+from auction_app.db.models import Auction
+from auction_app.services.archive import bid_model
+from auction_app.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Sorted set per auction: member is the user id, score is that user's highest bid.
+# Bids are always added with ZADD GT, whether or not the board is built, so a rebuild
+# merging its database snapshot into the same set cannot lose a bid committed after the
+# snapshot was read. Readers trust a board only once its built marker is set.
+RECORD_SCRIPT = """
+for i = 1, #ARGV - 1, 2 do
+    redis.call('ZADD', KEYS[1], 'GT', ARGV[i + 1], ARGV[i])
+end
+redis.call('EXPIRE', KEYS[1], %d)
+""" % LEADERBOARD_TTL
+
+_script = None
+_script_client = None
+
+
+def leaderboard_key(auction_id: int) -> str:
+    return f'auction:leaderboard:{auction_id}'
+
+
+def built_key(auction_id: int) -> str:
+    return f'auction:leaderboard:{auction_id}:built'
+
+
+# Both keys of a board, for invalidation
+def leaderboard_keys(auction_id: int) -> Tuple[str, str]:
+    return leaderboard_key(auction_id), built_key(auction_id)
+
+
+def _entries(rows, n: int) -> List[dict]:
+    return [{'user_id': int(member), 'amount': int(score)} for member, score in rows][:n]
+
+
+async def record_bids(auction_id: int, bids):
+    global _script, _script_client
+    redis = get_redis()
+    if redis is None:
+        return
+    if _script_client is not redis:
+        _script = redis.register_script(RECORD_SCRIPT)
+        _script_client = redis
+    args = []
+    for bid in bids:
+        args += [bid.user_id, bid.amount]
+    try:
+        await _script(keys=[leaderboard_key(auction_id)], args=args)
+    except RedisError:
+        # The board is dropped so the next read rebuilds it instead of serving a stale one
+        logger.warning('Не удалось обновить рейтинг ставок аукциона %s', auction_id, exc_info=True)
+        try:
+            await redis.delete(*leaderboard_keys(auction_id))
+        except RedisError:
+            pass
+
+
+async def _load(db: AsyncSession, auction_id: int) -> Optional[Dict[str, float]]:
+    auction = await db.get(Auction, auction_id)
+    if auction is None:
+        return None
+    model = bid_model(auction)
+    rows = (await db.execute(
+        select(model.user_id, func.max(model.amount)).where(model.auction_id == auction_id).group_by(model.user_id)
+    )).all()
+    return {str(user_id): amount for user_id, amount in rows}
+
+
+# Top n bidders by their highest bid; None when the auction does not exist
+async def top_bidders(db: AsyncSession, auction_id: int, n: int) -> Optional[List[dict]]:
+    redis = get_redis()
+    key, marker = leaderboard_keys(auction_id)
+    try:
+        if redis is not None:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.exists(marker)
+                pipe.zrevrange(key, 0, n - 1, withscores=True)
+                built, rows = await pipe.execute()
+            if built:
+                return _entries(rows, n)
+    except RedisError:
+        logger.warning('Рейтинг ставок недоступен, чтение из БД', exc_info=True)
+        redis = None
+
+    board = await _load(db, auction_id)
+    if board is None:
+        return None
+    if redis is not None:
+        try:
+            # The snapshot is merged into whatever bids were recorded meanwhile and the
+            # merged board is what gets returned
+            async with redis.pipeline(transaction=True) as pipe:
+                if board:
+                    pipe.zadd(key, board, gt=True)
+                pipe.expire(key, LEADERBOARD_TTL)
+                pipe.set(marker, 1, ex=LEADERBOARD_TTL)
+                pipe.zrevrange(key, 0, n - 1, withscores=True)
+                rows = (await pipe.execute())[-1]
+            return _entries(rows, n)
+        except RedisError:
+            logger.warning('Не удалось сохранить рейтинг ставок аукциона %s', auction_id, exc_info=True)
+    return _entries(sorted(board.items(), key=lambda item: -item[1]), n)
+
+
+# Current price of many auctions: the top score of each board, and the denormalized
+# auction.current_price for auctions whose board is not built
+async def current_prices(db: AsyncSession, auction_ids: List[int]) -> List[dict]:
+    prices: Dict[int, Optional[int]] = {}
+    redis = get_redis()
+    if redis is not None:
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                for auction_id in auction_ids:
+                    pipe.exists(built_key(auction_id))
+                    pipe.zrevrange(leaderboard_key(auction_id), 0, 0, withscores=True)
+                replies = await pipe.execute()
+            for auction_id, built, rows in zip(auction_ids, replies[::2], replies[1::2]):
+                if built:
+                    prices[auction_id] = int(rows[0][1]) if rows else None
+        except RedisError:
+            logger.warning('Рейтинг ставок недоступен, чтение из БД', exc_info=True)
+
+    missing = [auction_id for auction_id in auction_ids if auction_id not in prices]
+    if missing:
+        rows = (await db.execute(select(Auction.id, Auction.current_price).where(Auction.id.in_(missing)))).all()
+        prices.update({row.id: row.current_price for row in rows})
+    return [{'auction_id': auction_id, 'current_price': prices[auction_id]}
+            for auction_id in auction_ids if auction_id in prices]
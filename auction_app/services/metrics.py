@@ -0,0 +1,159 @@
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+from prometheus_client import (Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry,
+                               multiprocess)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from auction_app.config import SLOW_QUERY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency',
+                            ['method', 'route', 'status'])
+REQUEST_QUERIES = Histogram('http_request_db_queries', 'Database queries per request', ['route'],
+                            buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100))
+REQUEST_QUERY_SECONDS = Histogram('http_request_db_seconds', 'Time spent in database queries per request',
+                                  ['route'])
+QUERY_LATENCY = Histogram('db_query_duration_seconds', 'Database query latency', ['engine'])
+SLOW_QUERIES = Counter('db_slow_queries_total', 'Queries slower than SLOW_QUERY_SECONDS', ['route'])
+POOL_WAIT = Histogram('db_pool_checkout_wait_seconds', 'Time waiting for a pooled connection',
+                      buckets=(.0005, .001, .005, .01, .05, .1, .5, 1, 5, 30))
+REDIS_LATENCY = Histogram('redis_command_duration_seconds', 'Redis command latency', ['command'],
+                          buckets=(.0002, .0005, .001, .0025, .005, .01, .025, .05, .1, .5))
+
+BID_INGEST_BATCH = Histogram('bid_ingest_batch_size', 'Bids applied per stream transaction', ['shard'],
+                             buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+BID_INGEST_SECONDS = Histogram('bid_ingest_batch_seconds', 'Time to apply and commit one batch of bids', ['shard'])
+BID_INGEST_RESULTS = Counter('bid_ingest_results_total', 'Stream bids by outcome', ['result'])
+
+RATE_LIMIT_DECISIONS = Counter('rate_limit_requests_total', 'Rate limiter decisions', ['limiter', 'result'])
+
+
+# Query accounting for the request being served; set by MetricsMiddleware
+class RequestStats:
+    __slots__ = ('scope', 'queries', 'query_seconds')
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        return route_of(self.scope)
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar('request_stats', default=None)
+
+
+def route_of(scope) -> str:
+    route = scope.get('route')
+    return getattr(route, 'path', None) or 'unmatched'
+
+
+# Pure ASGI middleware so streaming responses are timed until their last chunk
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        stats = RequestStats(scope)
+        token = _request_stats.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            route = stats.route
+            REQUEST_LATENCY.labels(scope['method'], route, status).observe(time.perf_counter() - started)
+            REQUEST_QUERIES.labels(route).observe(stats.queries)
+            REQUEST_QUERY_SECONDS.labels(route).observe(stats.query_seconds)
+
+
+def instrument_engine(engine, name: str):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        QUERY_LATENCY.labels(name).observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += elapsed
+        if SLOW_QUERY_SECONDS and elapsed >= SLOW_QUERY_SECONDS:
+            route = stats.route if stats is not None else 'background'
+            SLOW_QUERIES.labels(route).inc()
+            logger.warning('Slow query (%.3fs) on %s: %s', elapsed, route, ' '.join(statement.split())[:1000])
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        if context.connection is not None:
+            context.connection.info.pop('query_started', None)
+
+
+# Queue pool that records how long each checkout waited for a free connection
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started)
+
+
+# Reads pool and password hasher state at scrape time
+class RuntimeCollector:
+    def __init__(self):
+        self.engines = {}
+        self.password_hasher = None
+
+    def collect(self):
+        in_use = GaugeMetricFamily('db_pool_connections_in_use', 'Checked out connections', labels=['engine'])
+        idle = GaugeMetricFamily('db_pool_connections_idle', 'Idle pooled connections', labels=['engine'])
+        overflow = GaugeMetricFamily('db_pool_overflow', 'Connections above pool_size', labels=['engine'])
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            if hasattr(pool, 'checkedout'):
+                in_use.add_metric([name], pool.checkedout())
+                idle.add_metric([name], pool.checkedin())
+                overflow.add_metric([name], max(pool.overflow(), 0))
+        yield from (in_use, idle, overflow)
+
+        if self.password_hasher is not None:
+            stats = self.password_hasher.stats()
+            for key in ('workers', 'in_flight', 'queued'):
+                yield GaugeMetricFamily(f'password_hasher_{key}', f'Password hasher {key}', value=stats[key])
+            for key in ('completed', 'rejected', 'wait_seconds', 'work_seconds'):
+                yield CounterMetricFamily(f'password_hasher_{key}', f'Password hasher {key}', value=stats[key])
+
+
+runtime_collector = RuntimeCollector()
+REGISTRY.register(runtime_collector)
+
+
+# Under the multi-worker launcher each worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+# and a scrape merges them; the runtime gauges are those of the worker answering the scrape
+def render_metrics():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(runtime_collector)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,74 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from auction_app.config import PASSWORD_WORKERS, PASSWORD_MAX_QUEUE, PASSWORD_BCRYPT_ROUNDS
+
+password_context = CryptContext(schemes=['bcrypt'], deprecated='auto',
+                               bcrypt__rounds=PASSWORD_BCRYPT_ROUNDS,
+                               bcrypt__min_rounds=PASSWORD_BCRYPT_ROUNDS)
+
+
+# bcrypt is CPU bound for tens of milliseconds and releases the GIL, so it runs in a small
+# thread pool instead of on the event loop. Waiting jobs are capped to shed login bursts.
+class PasswordHasher:
+    def __init__(self, workers: int, max_queue: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._workers = workers
+        self._max_queue = max_queue
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.work_seconds = 0.0
+
+    async def _run(self, func, *args):
+        if self.pending >= self._workers + self._max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail='Сервер перегружен, попробуйте позже',
+                                headers={'Retry-After': '1'})
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            self.wait_seconds += started - submitted
+            try:
+                return func(*args)
+            finally:
+                self.work_seconds += time.perf_counter() - started
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(password_context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(password_context.verify, password, hashed_password)
+
+    # Returns (valid, new_hash); new_hash is set when the stored hash uses deprecated parameters
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await self._run(password_context.verify_and_update, password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            'workers': self._workers,
+            'in_flight': min(self.pending, self._workers),
+            'queued': max(self.pending - self._workers, 0),
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'wait_seconds': self.wait_seconds,
+            'work_seconds': self.work_seconds,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(PASSWORD_WORKERS, PASSWORD_MAX_QUEUE)
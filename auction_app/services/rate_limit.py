@@ -0,0 +1,132 @@
+import logging
+import math
+import time
+from typing import Dict, List, Tuple
+from fastapi import HTTPException, Request
+from jose import JWTError, jwt
+from redis.exceptions import RedisError
+from auction_app.config import (SECRET_KEY, ALGORITHM, RATE_LIMIT_BID_USER, RATE_LIMIT_BID_IP,
+                                RATE_LIMIT_WRITE_USER, RATE_LIMIT_WRITE_IP, RATE_LIMIT_LOCAL_MAX)
+from auction_app.services.metrics import RATE_LIMIT_DECISIONS
+from auction_app.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Refills and takes one token from every bucket in KEYS, or from none of them.
+# ARGV holds (tokens per millisecond, capacity) for each key. Returns, per key, how many
+# milliseconds until a token is available (0 when the request was admitted).
+TOKEN_BUCKET_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local tokens, waits, admitted = {}, {}, true
+for i, key in ipairs(KEYS) do
+    local rate, capacity = tonumber(ARGV[i * 2 - 1]), tonumber(ARGV[i * 2])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(bucket[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+    available = math.min(capacity, available + elapsed * rate)
+    tokens[i] = available
+    waits[i] = 0
+    if available < 1 then
+        waits[i] = math.ceil((1 - available) / rate)
+        admitted = false
+    end
+end
+for i, key in ipairs(KEYS) do
+    local rate, capacity = tonumber(ARGV[i * 2 - 1]), tonumber(ARGV[i * 2])
+    if admitted then
+        tokens[i] = tokens[i] - 1
+    end
+    redis.call('HSET', key, 'tokens', tokens[i], 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate))
+end
+return waits
+"""
+
+
+def user_of(request: Request):
+    authorization = request.headers.get('authorization', '')
+    if not authorization.lower().startswith('bearer '):
+        return None
+    try:
+        return jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM]).get('sub')
+    except JWTError:
+        return None
+
+
+# Token bucket per user (from the bearer token) and per client IP, checked in one Lua call.
+# Keys Redis has rejected are remembered until their refill time, so clients hammering past
+# their quota are turned away by the worker without a Redis round trip.
+class TokenBucketLimiter:
+    def __init__(self, name: str, user: Tuple[float, int], ip: Tuple[float, int]):
+        self.name = name
+        self.user = user
+        self.ip = ip
+        self._blocked: Dict[str, float] = {}
+        self._script = None
+        self._script_client = None
+
+    def _buckets(self, request: Request) -> List[Tuple[str, Tuple[float, int]]]:
+        buckets = []
+        user = user_of(request)
+        if user is not None:
+            buckets.append((f'ratelimit:{self.name}:user:{user}', self.user))
+        if request.client is not None:
+            buckets.append((f'ratelimit:{self.name}:ip:{request.client.host}', self.ip))
+        return buckets
+
+    def _reject(self, wait: float, result: str):
+        RATE_LIMIT_DECISIONS.labels(self.name, result).inc()
+        raise HTTPException(status_code=429, detail='Слишком много запросов',
+                            headers={'Retry-After': str(max(1, math.ceil(wait)))})
+
+    def _block(self, key: str, until: float):
+        if len(self._blocked) >= RATE_LIMIT_LOCAL_MAX:
+            now = time.monotonic()
+            self._blocked = {k: v for k, v in self._blocked.items() if v > now}
+            if len(self._blocked) >= RATE_LIMIT_LOCAL_MAX:
+                return
+        self._blocked[key] = until
+
+    async def __call__(self, request: Request):
+        buckets = self._buckets(request)
+        if not buckets:
+            return
+
+        now = time.monotonic()
+        for key, _ in buckets:
+            until = self._blocked.get(key)
+            if until is not None:
+                if until > now:
+                    self._reject(until - now, 'rejected_local')
+                del self._blocked[key]
+
+        redis = get_redis()
+        if redis is None:
+            return
+        if self._script_client is not redis:
+            self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+            self._script_client = redis
+        args = []
+        for _, (rate, capacity) in buckets:
+            args += [rate / 1000, capacity]
+        try:
+            waits = await self._script(keys=[key for key, _ in buckets], args=args)
+        except RedisError as e:
+            # Fail open: losing Redis must not take the write paths down with it
+            RATE_LIMIT_DECISIONS.labels(self.name, 'error').inc()
+            logger.warning('Rate limiter unavailable: %s', e)
+            return
+
+        wait = max(int(w) for w in waits) / 1000
+        if wait:
+            now = time.monotonic()
+            for (key, _), key_wait in zip(buckets, waits):
+                if int(key_wait):
+                    self._block(key, now + int(key_wait) / 1000)
+            self._reject(wait, 'rejected')
+        RATE_LIMIT_DECISIONS.labels(self.name, 'allowed').inc()
+
+
+bid_limit = TokenBucketLimiter('bid', RATE_LIMIT_BID_USER, RATE_LIMIT_BID_IP)
+write_limit = TokenBucketLimiter('write', RATE_LIMIT_WRITE_USER, RATE_LIMIT_WRITE_IP)
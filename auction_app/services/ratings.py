@@ -0,0 +1,47 @@
+from typing import Dict, List
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from auction_app.db.models import SellerRating
+
+RATINGS = range(1, 6)
+
+
+# Add (delta=1) or remove (delta=-1) one rating in the seller's summary row. Runs in the
+# caller's transaction so the summary commits together with the feedback row. Ratings
+# outside 1..5 (rows older than the schema check) count as the nearest valid rating.
+async def apply_rating(db: AsyncSession, seller_id: int, rating: int, delta: int):
+    rating = min(max(rating, RATINGS[0]), RATINGS[-1])
+    bucket = f'rating_{rating}'
+    insert = pg_insert if db.bind.dialect.name == 'postgresql' else sqlite_insert
+    statement = insert(SellerRating).values(
+        seller_id=seller_id,
+        rating_count=max(delta, 0),
+        rating_sum=max(delta, 0) * rating,
+        **{f'rating_{r}': max(delta, 0) if r == rating else 0 for r in RATINGS},
+    )
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[SellerRating.seller_id],
+        set_={
+            'rating_count': SellerRating.rating_count + delta,
+            'rating_sum': SellerRating.rating_sum + delta * rating,
+            bucket: getattr(SellerRating, bucket) + delta,
+        },
+    ))
+
+
+def summary(seller_id: int, row) -> dict:
+    count = row.rating_count if row else 0
+    return {
+        'seller_id': seller_id,
+        'average': round(row.rating_sum / count, 2) if count else None,
+        'count': count,
+        'histogram': {r: getattr(row, f'rating_{r}') if row else 0 for r in RATINGS},
+    }
+
+
+async def get_summaries(db: AsyncSession, seller_ids: List[int]) -> Dict[int, dict]:
+    rows = (await db.scalars(select(SellerRating).where(SellerRating.seller_id.in_(seller_ids)))).all()
+    by_seller = {row.seller_id: row for row in rows}
+    return {seller_id: summary(seller_id, by_seller.get(seller_id)) for seller_id in seller_ids}
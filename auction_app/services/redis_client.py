@@ -0,0 +1,27 @@
+import time
+from typing import Optional
+import redis.asyncio as redis
+from auction_app.config import REDIS_URL
+from auction_app.services.metrics import REDIS_LATENCY
+
+redis_client: Optional[redis.Redis] = None
+
+
+# Times every command, including the rate limiter's EVALSHA calls
+class InstrumentedRedis(redis.Redis):
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_LATENCY.labels(str(args[0]).upper()).observe(time.perf_counter() - started)
+
+
+async def init_redis():
+    global redis_client
+    redis_client = InstrumentedRedis.from_url(REDIS_URL, encoding='utf-8', decode_responses=True)
+    return redis_client
+
+
+def get_redis() -> Optional[redis.Redis]:
+    return redis_client
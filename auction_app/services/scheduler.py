@@ -0,0 +1,162 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from redis.exceptions import LockError, RedisError
+from sqlalchemy import and_, case, literal, or_, select, update
+from auction_app.config import SCHEDULER_TICK, SCHEDULER_BATCH_SIZE, SCHEDULER_LEADER_TTL
+from auction_app.db.database import AsyncSessionLocal
+from auction_app.db.models import Auction, StatusCar
+from auction_app.services.cache import cache_key, invalidate
+from auction_app.services.events import publish_event
+from auction_app.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+DEADLINES_KEY = 'auction:deadlines'
+LEADER_KEY = 'auction:scheduler:leader'
+
+
+def _score(end_time: datetime) -> float:
+    return end_time.replace(tzinfo=timezone.utc).timestamp()
+
+
+async def schedule_deadline(auction_id: int, end_time: datetime):
+    redis = get_redis()
+    if redis is None:
+        return
+    try:
+        await redis.zadd(DEADLINES_KEY, {str(auction_id): _score(end_time)})
+    except RedisError:
+        # The scheduler rebuilds the set from Postgres when it takes leadership
+        logger.warning('Не удалось запланировать аукцион %s', auction_id, exc_info=True)
+
+
+async def unschedule_deadline(auction_id: int):
+    redis = get_redis()
+    if redis is None:
+        return
+    try:
+        await redis.zrem(DEADLINES_KEY, str(auction_id))
+    except RedisError:
+        logger.warning('Не удалось снять аукцион %s с расписания', auction_id, exc_info=True)
+
+
+# Deadlines of all active auctions, loaded into Redis by rebuild()
+def active_deadlines_query():
+    return select(Auction.id, Auction.end_time).where(Auction.status == StatusCar.active)
+
+
+# Closes auctions whose end_time has passed. Deadlines live in a Redis sorted set so each
+# tick reads only the due ids; a Redis lock makes a single worker the leader, and the
+# conditional UPDATE keeps each transition idempotent even if two leaders overlap.
+class AuctionScheduler:
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self._lock = None
+        self._leader = False
+
+    async def start(self, redis):
+        self._lock = redis.lock(LEADER_KEY, timeout=SCHEDULER_LEADER_TTL)
+        self._running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._leader:
+            try:
+                await self._lock.release()
+            except (LockError, RedisError):
+                pass
+            self._leader = False
+
+    async def _run(self):
+        while self._running:
+            try:
+                if await self._ensure_leader():
+                    while await self.finalize_due() == SCHEDULER_BATCH_SIZE:
+                        pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Includes raw driver errors (asyncpg raises OSError while Postgres is down);
+                # the loop must outlive them or auctions stop closing
+                logger.exception('Ошибка планировщика аукционов')
+            await asyncio.sleep(SCHEDULER_TICK)
+
+    async def _ensure_leader(self) -> bool:
+        if self._leader:
+            try:
+                await self._lock.reacquire()
+                return True
+            except LockError:
+                self._leader = False
+        if await self._lock.acquire(blocking=False):
+            # Leadership counts only once the deadlines are loaded; after a failed rebuild
+            # the lock expires and the next tick tries again
+            await self.rebuild()
+            self._leader = True
+        return self._leader
+
+    # Reload deadlines of active auctions, e.g. after a Redis flush or on first start
+    async def rebuild(self):
+        redis = get_redis()
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(active_deadlines_query())).all()
+        if rows:
+            await redis.zadd(DEADLINES_KEY, {str(row.id): _score(row.end_time) for row in rows})
+
+    async def finalize_due(self) -> int:
+        redis = get_redis()
+        now = datetime.utcnow()
+        due = await redis.zrangebyscore(DEADLINES_KEY, '-inf', _score(now), start=0, num=SCHEDULER_BATCH_SIZE)
+        if not due:
+            return 0
+        ids = [int(auction_id) for auction_id in due]
+
+        sold = and_(Auction.bid_count > 0,
+                    or_(Auction.min_price.is_(None), Auction.current_price >= Auction.min_price))
+        async with AsyncSessionLocal() as db:
+            closed = (await db.execute(
+                update(Auction)
+                .where(Auction.id.in_(ids), Auction.status == StatusCar.active, Auction.end_time <= now)
+                .values(status=case((sold, literal(StatusCar.completed, Auction.status.type)),
+                                   else_=literal(StatusCar.canceled, Auction.status.type)))
+                .returning(Auction.id, Auction.status, Auction.end_time, Auction.current_price, Auction.leader_id)
+                .execution_options(synchronize_session=False)
+            )).all()
+            # Ids not closed were extended, canceled or deleted meanwhile
+            rest = [auction_id for auction_id in ids if auction_id not in {row.id for row in closed}]
+            still_active = (await db.execute(
+                select(Auction.id, Auction.end_time)
+                .where(Auction.id.in_(rest), Auction.status == StatusCar.active)
+            )).all() if rest else []
+            await db.commit()
+
+        active_ids = {row.id for row in still_active}
+        stale = [str(auction_id) for auction_id in ids if auction_id not in active_ids]
+        if stale:
+            await redis.zrem(DEADLINES_KEY, *stale)
+        if still_active:
+            await redis.zadd(DEADLINES_KEY, {str(row.id): _score(row.end_time) for row in still_active})
+
+        if closed:
+            await invalidate(*[cache_key('auction', row.id) for row in closed])
+        for row in closed:
+            await publish_event(row.id, 'status', {
+                'status': row.status,
+                'end_time': row.end_time,
+                'current_price': row.current_price,
+                'leader_id': row.leader_id,
+            })
+        return len(due)
+
+
+scheduler = AuctionScheduler()
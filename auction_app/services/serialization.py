@@ -0,0 +1,74 @@
+import typing
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, List, Tuple, Type
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel
+from auction_app.config import FAST_JSON
+
+OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+
+def _unwrap(annotation) -> Tuple[Any, bool]:
+    # Optional[X] -> X, List[X] -> (X, many)
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    origin = typing.get_origin(annotation)
+    if origin in (list, List):
+        return args[0], True
+    if origin is typing.Union and len(args) == 1:
+        return _unwrap(args[0])
+    return annotation, False
+
+
+# (field, nested schema, is a list, is a date) for each field of the schema
+@lru_cache(maxsize=None)
+def _plan(schema: Type[BaseModel]):
+    plan = []
+    for name, field in schema.model_fields.items():
+        inner, many = _unwrap(field.annotation)
+        nested = inner if isinstance(inner, type) and issubclass(inner, BaseModel) else None
+        plan.append((name, nested, many, inner is date))
+    return plan
+
+
+# Build the response dict without validation. Only for rows from our own queries, which
+# already have the schema's types; the one coercion kept is DateTime columns exposed as date.
+def dump(schema: Type[BaseModel], obj) -> dict:
+    get = obj.get if isinstance(obj, dict) else lambda name: getattr(obj, name, None)
+    out = {}
+    for name, nested, many, is_date in _plan(schema):
+        value = get(name)
+        if value is not None:
+            if nested is not None:
+                value = [dump(nested, item) for item in value] if many else dump(nested, value)
+            elif is_date and isinstance(value, datetime):
+                value = value.date()
+        out[name] = value
+    return out
+
+
+def dumps(schema: Type[BaseModel], obj) -> str:
+    return orjson.dumps(dump(schema, obj), default=_default, option=OPTIONS).decode()
+
+
+class FastJSONResponse(Response):
+    media_type = 'application/json'
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default, option=OPTIONS)
+
+
+# With FAST_JSON on, encode the payload directly and bypass response_model validation;
+# otherwise hand it back for FastAPI to validate as usual
+def fast_response(schema: Type[BaseModel], payload):
+    if not FAST_JSON:
+        return payload
+    return FastJSONResponse(dump(schema, payload))
@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from auction_app.config import REFRESH_TOKEN_EXPIRE_DAYS, TOKEN_STORE, TOKEN_PURGE_BATCH
+from auction_app.db.database import AsyncSessionLocal
+from auction_app.db.models import RefreshToken, UserProfile
+from auction_app.services.redis_client import get_redis
+
+REFRESH_TTL = REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_owner_query(token: str):
+    return (select(RefreshToken.id, UserProfile.id, UserProfile.username)
+            .join(UserProfile, RefreshToken.user_id == UserProfile.id)
+            .where(RefreshToken.token == token))
+
+
+# Legacy storage in the refresh_token table
+class DbTokenStore:
+    async def save(self, db: AsyncSession, token: str, user_id: int, username: str):
+        db.add(RefreshToken(token=token, user_id=user_id))
+        await db.commit()
+
+    async def consume(self, db: AsyncSession, token: str) -> Optional[Tuple[int, str]]:
+        row = (await db.execute(token_owner_query(token))).first()
+        if row is None:
+            return None
+        await db.execute(delete(RefreshToken).where(RefreshToken.id == row[0]))
+        return row[1], row[2]
+
+    async def revoke(self, db: AsyncSession, token: str) -> bool:
+        result = await db.execute(delete(RefreshToken).where(RefreshToken.token == token))
+        await db.commit()
+        return result.rowcount > 0
+
+
+# Only sha256 digests are stored; keys expire with the token. Rotated and revoked digests
+# stay in a revocation key until expiry, so reuse of a stolen token revokes the whole family.
+class RedisTokenStore:
+    _legacy = DbTokenStore()
+
+    @staticmethod
+    def _token_key(digest: str) -> str:
+        return f'refresh:token:{digest}'
+
+    @staticmethod
+    def _revoked_key(digest: str) -> str:
+        return f'refresh:revoked:{digest}'
+
+    @staticmethod
+    def _user_key(user_id: int) -> str:
+        return f'refresh:user:{user_id}'
+
+    async def save(self, db: AsyncSession, token: str, user_id: int, username: str):
+        digest = hash_token(token)
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.set(self._token_key(digest), json.dumps({'user_id': user_id, 'username': username}), ex=REFRESH_TTL)
+            pipe.sadd(self._user_key(user_id), digest)
+            pipe.expire(self._user_key(user_id), REFRESH_TTL)
+            await pipe.execute()
+
+    async def consume(self, db: AsyncSession, token: str) -> Optional[Tuple[int, str]]:
+        redis = get_redis()
+        digest = hash_token(token)
+        raw = await redis.getdel(self._token_key(digest))
+        if raw is None:
+            user_id = await redis.get(self._revoked_key(digest))
+            if user_id is not None:
+                await self.revoke_user(int(user_id))
+                return None
+            # Tokens issued before the switch to Redis are still in refresh_token; they are
+            # spent there, and the rotation that follows moves the user to Redis
+            owner = await self._legacy.consume(db, token)
+            if owner is not None:
+                await db.commit()
+            return owner
+        data = json.loads(raw)
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._revoked_key(digest), data['user_id'], ex=REFRESH_TTL)
+            pipe.srem(self._user_key(data['user_id']), digest)
+            await pipe.execute()
+        return data['user_id'], data['username']
+
+    async def revoke(self, db: AsyncSession, token: str) -> bool:
+        return await self.consume(db, token) is not None
+
+    async def revoke_user(self, user_id: int):
+        redis = get_redis()
+        digests = await redis.smembers(self._user_key(user_id))
+        async with redis.pipeline(transaction=True) as pipe:
+            for digest in digests:
+                pipe.delete(self._token_key(digest))
+                pipe.set(self._revoked_key(digest), user_id, ex=REFRESH_TTL)
+            pipe.delete(self._user_key(user_id))
+            await pipe.execute()
+
+
+token_store = RedisTokenStore() if TOKEN_STORE == 'redis' else DbTokenStore()
+
+
+# Deletes expired rows of the legacy refresh_token table in small batches
+async def purge_legacy_tokens(batch_size: int = TOKEN_PURGE_BATCH) -> int:
+    cutoff = datetime.utcnow() - timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    total = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            batch = select(RefreshToken.id).where(RefreshToken.created_data < cutoff).limit(batch_size)
+            result = await db.execute(delete(RefreshToken).where(RefreshToken.id.in_(batch.scalar_subquery())))
+            await db.commit()
+            total += result.rowcount
+            if result.rowcount < batch_size:
+                return total
+
+
+if __name__ == '__main__':
+    print(f'Удалено токенов: {asyncio.run(purge_legacy_tokens())}')
@@ -0,0 +1,104 @@
+"""Per-item serialization cost of every schema in auction_app/db/schema.py.
+
+Compares three ways of turning an ORM-like row into a JSON body:
+
+    response_model  validate from attributes, dump to JSON-able python, json.dumps (FastAPI default)
+    pydantic_json   validate from attributes, model_dump_json (cache.serialize without FAST_JSON)
+    fast            serialization.dumps: build the dict without validation, encode with orjson
+
+    python -m benchmarks.serialization --output serialization.json
+"""
+import argparse
+import inspect
+import json
+import time
+import typing
+from datetime import date, datetime
+from enum import Enum
+from types import SimpleNamespace
+
+from pydantic import BaseModel, EmailStr, TypeAdapter
+
+from auction_app.db import schema as schemas
+from auction_app.services.serialization import dumps
+
+
+def sample(annotation):
+    origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+    if origin is typing.Union:
+        return sample(next(arg for arg in args if arg is not type(None)))
+    if origin in (list, typing.List):
+        return [sample(args[0]) for _ in range(3)]
+    if origin in (dict, typing.Dict):
+        return {key: sample(args[1]) for key in (range(1, 6) if args[0] is int else 'abcde')}
+    if annotation is EmailStr:
+        return 'user@example.com'
+    if inspect.isclass(annotation):
+        if issubclass(annotation, BaseModel):
+            return SimpleNamespace(**{name: sample(field.annotation) for name, field in annotation.model_fields.items()})
+        if issubclass(annotation, Enum):
+            return next(iter(annotation))
+        if issubclass(annotation, datetime):
+            return datetime(2026, 10, 18, 12, 30, 15, 123456)
+        if issubclass(annotation, date):
+            return date(2026, 10, 18)
+        if issubclass(annotation, bool):
+            return True
+        if issubclass(annotation, int):
+            return 3
+        if issubclass(annotation, float):
+            return 15250.5
+        if issubclass(annotation, str):
+            return 'Toyota Camry in good condition'
+    raise TypeError(f'No sample for {annotation!r}')
+
+
+def paths(schema):
+    adapter = TypeAdapter(schema)
+
+    def response_model(obj):
+        return json.dumps(adapter.dump_python(adapter.validate_python(obj, from_attributes=True), mode='json'),
+                          ensure_ascii=False, separators=(',', ':'))
+
+    def pydantic_json(obj):
+        return schema.model_validate(obj, from_attributes=True).model_dump_json()
+
+    def fast(obj):
+        return dumps(schema, obj)
+
+    return {'response_model': response_model, 'pydantic_json': pydantic_json, 'fast': fast}
+
+
+def measure(func, obj, seconds: float) -> float:
+    func(obj)
+    count, started = 0, time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            func(obj)
+        count += 100
+    return (time.perf_counter() - started) / count
+
+
+def main(args):
+    models = [model for _, model in inspect.getmembers(schemas, inspect.isclass)
+              if issubclass(model, BaseModel) and model.__module__ == schemas.__name__]
+    results = {}
+    print(f"{'schema':<24}{'response_model':>16}{'pydantic_json':>16}{'fast':>10}{'speedup':>10}   (us per item)")
+    for model in models:
+        obj = sample(model)
+        timings = {name: measure(func, obj, args.seconds) * 1e6 for name, func in paths(model).items()}
+        timings['speedup'] = timings['response_model'] / timings['fast']
+        results[model.__name__] = {key: round(value, 2) for key, value in timings.items()}
+        print(f"{model.__name__:<24}{timings['response_model']:>16.2f}{timings['pydantic_json']:>16.2f}"
+              f"{timings['fast']:>10.2f}{timings['speedup']:>9.1f}x")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'date': datetime.utcnow().isoformat(), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=0.5, help='time spent per schema and path')
+    parser.add_argument('--output', help='write results as JSON')
+    main(parser.parse_args())
@@ -1,7 +1,9 @@
+import os
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
+from auction_app.config import DB_URL
 from auction_app.db.models import *
 from alembic import context
 
@@ -14,6 +16,10 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# DB_URL from the environment wins over alembic.ini; '%' is escaped for configparser
+if os.getenv('DB_URL'):
+    config.set_main_option('sqlalchemy.url', DB_URL.replace('%', '%%'))
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
@@ -0,0 +1,50 @@
+"""auction current price and bid count
+
+Revision ID: 5b1e7c2a9d40
+Revises: 0d3c13f15894
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e7c2a9d40'
+down_revision: Union[str, None] = '0d3c13f15894'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('auction', sa.Column('current_price', sa.Integer(), nullable=True))
+    op.add_column('auction', sa.Column('bid_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('auction', sa.Column('leader_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('auction_leader_id_fkey', 'auction', 'user_profile', ['leader_id'], ['id'],
+                          ondelete='SET NULL')
+
+    # Backfill from existing bids; highest amount wins, earliest bid breaks ties
+    op.execute("""
+        UPDATE auction SET
+            current_price = top.amount,
+            leader_id = top.user_id,
+            bid_count = top.bid_count
+        FROM (
+            SELECT DISTINCT ON (auction_id) auction_id, amount, user_id,
+                   count(*) OVER (PARTITION BY auction_id) AS bid_count
+            FROM bid
+            ORDER BY auction_id, amount DESC, id ASC
+        ) AS top
+        WHERE auction.id = top.auction_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('auction_leader_id_fkey', 'auction', type_='foreignkey')
+    op.drop_column('auction', 'leader_id')
+    op.drop_column('auction', 'bid_count')
+    op.drop_column('auction', 'current_price')
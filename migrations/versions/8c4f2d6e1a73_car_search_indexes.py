@@ -0,0 +1,43 @@
+"""car search indexes
+
+Revision ID: 8c4f2d6e1a73
+Revises: 5b1e7c2a9d40
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4f2d6e1a73'
+down_revision: Union[str, None] = '5b1e7c2a9d40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        # Must match car_document() in db/models.py
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_car_search ON car
+            USING gin (to_tsvector('simple'::regconfig, brand || ' ' || model || ' ' || description))
+        """)
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_car_brand_trgm ON car USING gin (brand gin_trgm_ops)')
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_car_model_trgm ON car USING gin (model gin_trgm_ops)')
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_car_price ON car (price)')
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_car_year ON car (year)')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_car_year')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_car_price')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_car_model_trgm')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_car_brand_trgm')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_car_search')
@@ -0,0 +1,44 @@
+"""indexes for foreign keys and hot predicates
+
+Revision ID: a3d9e5b7c210
+Revises: 8c4f2d6e1a73
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d9e5b7c210'
+down_revision: Union[str, None] = '8c4f2d6e1a73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_bid_auction_registered', 'bid', ['auction_id', 'date_registered', 'id']),
+    ('ix_bid_auction_amount', 'bid', ['auction_id', 'amount']),
+    ('ix_bid_user_id', 'bid', ['user_id']),
+    ('ix_feedback_seller_create_date', 'feedback', ['seller_feedback_id', 'create_date', 'id']),
+    ('ix_feedback_bayer_id', 'feedback', ['bayer_id']),
+    ('ix_car_seller_id', 'car', ['seller_id']),
+    ('ix_refresh_token_user_id', 'refresh_token', ['user_id']),
+    ('ix_auction_status_end_time', 'auction', ['status', 'end_time']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY does not lock writes but cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,32 @@
+"""bid stream offset
+
+Revision ID: a7c3e1f5b820
+Revises: f3b7d9a1c284
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e1f5b820'
+down_revision: Union[str, None] = 'f3b7d9a1c284'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('bid_stream_offset',
+    sa.Column('shard', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('last_id', sa.String(length=32), nullable=False),
+    sa.PrimaryKeyConstraint('shard')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('bid_stream_offset')
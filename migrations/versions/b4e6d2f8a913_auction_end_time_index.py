@@ -0,0 +1,32 @@
+"""auction end_time index
+
+Revision ID: b4e6d2f8a913
+Revises: a7c3e1f5b820
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e6d2f8a913'
+down_revision: Union[str, None] = 'a7c3e1f5b820'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # /auction/?sort=end_time without a status filter cannot use ix_auction_status_end_time
+    with op.get_context().autocommit_block():
+        op.create_index('ix_auction_end_time', 'auction', ['end_time', 'id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_auction_end_time', table_name='auction', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,50 @@
+"""seller rating summary
+
+Revision ID: c7b2a4f9e615
+Revises: a3d9e5b7c210
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7b2a4f9e615'
+down_revision: Union[str, None] = 'a3d9e5b7c210'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('seller_rating',
+    sa.Column('seller_id', sa.Integer(), nullable=False),
+    sa.Column('rating_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('rating_1', sa.Integer(), nullable=False),
+    sa.Column('rating_2', sa.Integer(), nullable=False),
+    sa.Column('rating_3', sa.Integer(), nullable=False),
+    sa.Column('rating_4', sa.Integer(), nullable=False),
+    sa.Column('rating_5', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['seller_id'], ['user_profile.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('seller_id')
+    )
+    # Must match apply_rating(): ratings outside 1..5 count as the nearest valid rating
+    op.execute("""
+        INSERT INTO seller_rating (seller_id, rating_count, rating_sum,
+                                   rating_1, rating_2, rating_3, rating_4, rating_5)
+        SELECT seller_feedback_id, count(*), sum(least(greatest(rating, 1), 5)),
+               count(*) FILTER (WHERE rating <= 1), count(*) FILTER (WHERE rating = 2),
+               count(*) FILTER (WHERE rating = 3), count(*) FILTER (WHERE rating = 4),
+               count(*) FILTER (WHERE rating >= 5)
+        FROM feedback
+        GROUP BY seller_feedback_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('seller_rating')
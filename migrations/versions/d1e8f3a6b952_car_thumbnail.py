@@ -0,0 +1,28 @@
+"""car thumbnail
+
+Revision ID: d1e8f3a6b952
+Revises: c7b2a4f9e615
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1e8f3a6b952'
+down_revision: Union[str, None] = 'c7b2a4f9e615'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('car', sa.Column('thumbnail', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('car', 'thumbnail')
@@ -0,0 +1,51 @@
+"""bid archive
+
+Revision ID: e5a2c8d4b716
+Revises: d1e8f3a6b952
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a2c8d4b716'
+down_revision: Union[str, None] = 'd1e8f3a6b952'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('auction', sa.Column('winning_bid_id', sa.Integer(), nullable=True))
+    op.add_column('auction', sa.Column('archived_at', sa.DateTime(), nullable=True))
+    # Monthly partitions are created by the archiver as it moves bids
+    op.create_table('bid_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('auction_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('date_registered', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['auction_id'], ['auction.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user_profile.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', 'date_registered'),
+    postgresql_partition_by='RANGE (date_registered)'
+    )
+    op.create_index('ix_bid_archive_auction_registered', 'bid_archive', ['auction_id', 'date_registered', 'id'])
+    op.create_index('ix_bid_archive_auction_amount', 'bid_archive', ['auction_id', 'amount'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("""
+        INSERT INTO bid (id, auction_id, user_id, amount, date_registered)
+        SELECT id, auction_id, user_id, amount, date_registered FROM bid_archive
+    """)
+    op.drop_index('ix_bid_archive_auction_amount', table_name='bid_archive')
+    op.drop_index('ix_bid_archive_auction_registered', table_name='bid_archive')
+    op.drop_table('bid_archive')
+    op.drop_column('auction', 'archived_at')
+    op.drop_column('auction', 'winning_bid_id')
@@ -0,0 +1,41 @@
+"""proxy bid
+
+Revision ID: f3b7d9a1c284
+Revises: e5a2c8d4b716
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b7d9a1c284'
+down_revision: Union[str, None] = 'e5a2c8d4b716'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('proxy_bid',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('auction_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('max_amount', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['auction_id'], ['auction.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user_profile.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('auction_id', 'user_id', name='uq_proxy_bid_auction_user')
+    )
+    op.create_index('ix_proxy_bid_auction_max', 'proxy_bid',
+                    ['auction_id', sa.text('max_amount DESC'), 'created_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_proxy_bid_auction_max', table_name='proxy_bid')
+    op.drop_table('proxy_bid')